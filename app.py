@@ -1,10 +1,19 @@
 """Interface web visual para o scraper do Viva Real."""
 import streamlit as st
-import json
+import html
+import logging
+import os
+import re
+import orjson
 from pathlib import Path
-from src.scraper import VivaRealScraper
+from typing import Dict, Optional
+from src.scraper import VivaRealScraper, scrape_many
 from datetime import datetime
-import time
+from logging.handlers import RotatingFileHandler
+import uuid
+from functools import lru_cache
+from src.utils import HostThrottle
+from src.history import HISTORY_FILE_PREFIX, HistoryStore, purge_stale_histories
 
 # Configuração da página
 st.set_page_config(
@@ -65,11 +74,38 @@ st.markdown("""
 st.markdown('<h1 class="main-header">🏠 Viva Real Scraper</h1>', unsafe_allow_html=True)
 st.markdown("---")
 
+# Diretório de saída (criado uma única vez, no carregamento do script)
+OUTPUT_DIR = Path("data/output")
+OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+# Log de erros em arquivo (o Streamlit reexecuta o script, então o handler é registrado uma única vez)
+LOG_DIR = Path("data/logs")
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+logger = logging.getLogger(__name__)
+root_logger = logging.getLogger()
+if not any(getattr(handler, '_vivareal_app', False) for handler in root_logger.handlers):
+    file_handler = RotatingFileHandler(LOG_DIR / "scraper.log", maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    # Só falhas vão para o arquivo: o INFO de cada extração (e de urllib3/selenium) fica no console
+    file_handler.setLevel(logging.WARNING)
+    file_handler._vivareal_app = True
+    root_logger.addHandler(file_handler)
+
+# Histórico da sessão: dados completos em disco, apenas o índice fica em memória
+# Cada nova sessão remove os arquivos que sessões abandonadas deixaram para trás
+HISTORY_MAX_AGE_HOURS = 24
+if 'history_id' not in st.session_state:
+    purge_stale_histories(OUTPUT_DIR, max_age_hours=HISTORY_MAX_AGE_HOURS)
+    st.session_state['history_id'] = uuid.uuid4().hex
+history_store = HistoryStore(OUTPUT_DIR / f"{HISTORY_FILE_PREFIX}{st.session_state['history_id']}.ndjson")
+
 # Sidebar
 with st.sidebar:
     st.header("⚙️ Configurações")
     headless_mode = st.checkbox("Modo Headless", value=True, help="Executa sem abrir o navegador")
     timeout = st.slider("Timeout (segundos)", min_value=10, max_value=60, value=45, step=5)
+    parallel_workers = st.slider("Navegadores em paralelo", min_value=1, max_value=4, value=2,
+                                 help="Quantidade de navegadores usados ao processar uma lista de URLs")
     
     st.markdown("---")
     st.markdown("### 📖 Como usar")
@@ -90,6 +126,7 @@ with st.sidebar:
         st.success(f"✅ {len(st.session_state['scraping_history'])} imóvel(is) já extraído(s)")
         if st.button("🗑️ Limpar Histórico", use_container_width=True):
             st.session_state['scraping_history'] = []
+            history_store.clear()
             st.rerun()
     else:
         st.info("Nenhum imóvel extraído ainda")
@@ -126,19 +163,27 @@ else:
     url_input = None
 
 # Validação da URL
+_VIVAREAL_URL_RE = re.compile(r'^https?://(?:[\w-]+\.)*vivareal\.com\.br/(?:[^?#]*/)?imovel/', re.IGNORECASE)
+
 def validate_url(url: str) -> bool:
-    """Valida se a URL é do Viva Real."""
-    if not url:
-        return False
-    return 'vivareal.com.br' in url.lower() and '/imovel/' in url.lower()
+    """Valida se a URL é de um imóvel do Viva Real."""
+    return bool(url and _VIVAREAL_URL_RE.match(url))
+
+# Função auxiliar para obter o ID do imóvel a partir da URL
+_PROPERTY_ID_RE = re.compile(r'-id-(\d+)')
+
+def property_id_of(url: Optional[str], default: Optional[str] = None) -> str:
+    """Retorna o ID do anúncio (-id-<número>) da URL; sem ID, usa default ou um identificador único."""
+    match = _PROPERTY_ID_RE.search(url or '')
+    if match:
+        return match.group(1)
+    # Um timestamp em segundos colidiria entre URLs sem ID concluídas em paralelo no mesmo segundo
+    return default if default is not None else uuid.uuid4().hex
 
 # Função auxiliar para processar uma única URL
-def process_single_url(url: str, scraper: VivaRealScraper, progress_bar=None, status_text=None, total=None):
-    """Processa uma única URL e retorna os dados."""
+def process_single_url(url: str, scraper: VivaRealScraper):
+    """Processa uma única URL e retorna os dados (a gravação em disco fica a cargo de quem chama)."""
     try:
-        if status_text:
-            status_text.text(f"🔄 Processando: {url[:60]}...")
-        
         data = scraper.scrape(url)
         
         # Valida se os dados foram extraídos corretamente
@@ -149,34 +194,56 @@ def process_single_url(url: str, scraper: VivaRealScraper, progress_bar=None, st
         if not data.get('url') or data.get('url') != url:
             return None, f"URL do dado extraído ({data.get('url')}) não corresponde à URL solicitada ({url})"
         
-        # Salvar dados
-        output_dir = Path("data/output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        property_id = url.split('-id-')[1].split('/')[0] if '-id-' in url else str(int(time.time()))
-        filename = f"property_{property_id}.json"
-        filepath = output_dir / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Adiciona ao histórico/cache
-        if 'scraping_history' not in st.session_state:
-            st.session_state['scraping_history'] = []
-        st.session_state['scraping_history'].append({
-            'timestamp': data.get('scraped_at'),
-            'url': url,
-            'property_id': property_id,
-            'data': data,
-            'filepath': str(filepath)
-        })
-        
-        if progress_bar and total:
-            completed = len(st.session_state.get('scraping_history', []))
-            progress_bar.progress(completed / total)
-        
         return data, None
     except Exception as e:
-        return None, str(e)
+        # O traceback completo já é registrado no log pelo scraper
+        return None, f"{type(e).__name__}: {e}"
+
+# Função auxiliar para gravar vários imóveis de uma vez
+def save_properties(records) -> Dict[Path, str]:
+    """
+    Serializa e grava cada (filepath, data) com uma única escrita e um único fsync por arquivo.
+    Uma falha não interrompe as demais gravações: retorna {filepath: erro} dos arquivos que falharam.
+    """
+    errors = {}
+    for filepath, data in records:
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+            with open(filepath, 'wb', buffering=1 << 20) as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        except (OSError, TypeError) as e:
+            logger.exception(f"Falha ao gravar {filepath}")
+            errors[filepath] = f"{type(e).__name__}: {e}"
+    return errors
+
+# Função auxiliar para registrar um imóvel no histórico
+def add_to_history(url: str, property_id: str, data: dict, filepath: Path):
+    """Grava os dados no histórico em disco e guarda apenas o índice na sessão."""
+    if 'scraping_history' not in st.session_state:
+        st.session_state['scraping_history'] = []
+    history_store.append(data)
+    st.session_state['scraping_history'].append({
+        'timestamp': data.get('scraped_at'),
+        'url': url,
+        'property_id': property_id,
+        'filepath': str(filepath)
+    })
+
+# Função auxiliar para formatar valores em reais
+_BRL_SEPARATORS = str.maketrans({',': '.', '.': ','})
+
+@lru_cache(maxsize=256)
+def format_brl(value: float) -> str:
+    """Formata um valor no padrão brasileiro (R$ 1.234,56) em uma única passada de translate."""
+    return f"R$ {value:,.2f}".translate(_BRL_SEPARATORS)
+
+# Função auxiliar para os blocos de informação
+def render_info_boxes(rows):
+    """Renderiza vários info-box (rótulo, valor) em um único st.markdown."""
+    html_blob = ''.join(f'<div class="info-box"><strong>{label}</strong> {value}</div>' for label, value in rows)
+    st.markdown(html_blob, unsafe_allow_html=True)
 
 # Processamento
 
@@ -196,32 +263,22 @@ if scrape_button:
                     st.balloons()
                     
                     # Salvar dados
-                    output_dir = Path("data/output")
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    property_id = url_input.split('-id-')[1].split('/')[0] if '-id-' in url_input else str(int(time.time()))
-                    filename = f"property_{property_id}.json"
-                    filepath = output_dir / filename
-                    
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
+                    property_id = property_id_of(url_input)
+                    filepath = OUTPUT_DIR / f"property_{property_id}.json"
+                    write_errors = save_properties([(filepath, data)])
+                    if write_errors:
+                        st.warning(f"⚠️ Não foi possível salvar o arquivo {filepath}: {write_errors[filepath]}")
                     
                     # Adiciona ao histórico/cache
-                    if 'scraping_history' not in st.session_state:
-                        st.session_state['scraping_history'] = []
-                    st.session_state['scraping_history'].append({
-                        'timestamp': data.get('scraped_at'),
-                        'url': url_input,
-                        'property_id': property_id,
-                        'data': data,
-                        'filepath': str(filepath)
-                    })
+                    add_to_history(url_input, property_id, data, filepath)
                     
                     st.session_state['scraped_data'] = data
+                    st.session_state['property_id'] = property_id
                     st.session_state['filepath'] = str(filepath)
                     
                 except Exception as e:
                     st.error(f"❌ Erro ao extrair dados: {str(e)}")
-                    st.exception(e)
+                    logger.exception(f"Falha ao extrair dados de {url_input}")
     else:  # Lista de URLs
         if not url_list or not url_list.strip():
             st.error("❌ Por favor, insira pelo menos uma URL")
@@ -248,20 +305,46 @@ if scrape_button:
                 successful = 0
                 failed = 0
                 errors_list = []
+                pending_writes = []
+                last_data = None
+                last_property_id = None
+                # Os resultados chegam na ordem de conclusão; histórico e prévia seguem a ordem da lista
+                input_order = {url: position for position, url in enumerate(valid_urls)}
                 
-                with VivaRealScraper(headless=headless_mode, timeout=timeout) as scraper:
-                    for idx, url in enumerate(valid_urls, 1):
-                        data, error = process_single_url(url, scraper, progress_bar, status_text, len(valid_urls))
-                        if data:
-                            successful += 1
-                        else:
-                            failed += 1
-                            errors_list.append({'url': url, 'error': error})
-                        
-                        # Delay maior entre requisições para garantir que página anterior foi processada
-                        # O estado já é limpo automaticamente pelo scraper, mas adiciona delay para evitar rate limiting
-                        if idx < len(valid_urls):
-                            time.sleep(3)
+                # Pool de navegadores já inicializados: o custo de abrir o Chrome é pago uma vez por worker
+                # e as esperas de rede/renderização de URLs diferentes se sobrepõem
+                num_workers = min(parallel_workers, len(valid_urls))
+                # Mantém o intervalo de 3s entre requisições ao mesmo host para evitar rate limiting
+                throttle = HostThrottle(min_interval=3.0)
+                status_text.text(f"🔄 Iniciando {num_workers} navegador(es)...")
+                
+                results = scrape_many(valid_urls, concurrency=num_workers, headless=headless_mode, timeout=timeout,
+                                      throttle=throttle, process=process_single_url)
+                for idx, (url, (data, error)) in enumerate(results, 1):
+                    if data:
+                        property_id = property_id_of(url)
+                        filepath = OUTPUT_DIR / f"property_{property_id}.json"
+                        pending_writes.append((input_order[url], url, property_id, filepath, data))
+                    else:
+                        failed += 1
+                        errors_list.append({'URL': url, 'Erro': error})
+                    
+                    status_text.text(f"🔄 Concluído ({idx}/{len(valid_urls)}): {url[:60]}...")
+                    progress_bar.progress(idx / len(valid_urls))
+                
+                # Grava todos os imóveis de uma vez, fora do loop de scraping
+                pending_writes.sort(key=lambda record: record[0])
+                write_errors = save_properties([(filepath, data) for _, _, _, filepath, data in pending_writes])
+                for _, url, property_id, filepath, data in pending_writes:
+                    if filepath in write_errors:
+                        failed += 1
+                        errors_list.append({'URL': url, 'Erro': f"Falha ao salvar {filepath}: {write_errors[filepath]}"})
+                        continue
+                    successful += 1
+                    # Adiciona ao histórico/cache
+                    add_to_history(url, property_id, data, filepath)
+                    last_data = data
+                    last_property_id = property_id
                 
                 progress_bar.progress(1.0)
                 status_text.empty()
@@ -270,16 +353,14 @@ if scrape_button:
                     st.success(f"✅ {successful} imóvel(is) extraído(s) com sucesso!")
                     st.balloons()
                     
-                    # Mostra o último imóvel processado
-                    if st.session_state.get('scraping_history'):
-                        last_property = st.session_state['scraping_history'][-1]
-                        st.session_state['scraped_data'] = last_property['data']
+                    # Mostra o último imóvel da lista (na ordem de entrada) extraído com sucesso
+                    st.session_state['scraped_data'] = last_data
+                    st.session_state['property_id'] = last_property_id
                 
                 if failed > 0:
                     st.warning(f"⚠️ {failed} imóvel(is) falharam durante a extração")
                     with st.expander("Ver erros"):
-                        for error_item in errors_list:
-                            st.error(f"**URL:** {error_item['url']}\n**Erro:** {error_item['error']}")
+                        st.table(errors_list)
 
 # Exibição dos dados
 if 'scraped_data' in st.session_state:
@@ -292,7 +373,7 @@ if 'scraped_data' in st.session_state:
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("💰 Preço", f"R$ {data.get('price', 0):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') if data.get('price') else "N/A")
+        st.metric("💰 Preço", format_brl(data['price']) if data.get('price') else "N/A")
     
     with col2:
         st.metric("📐 Metragem", f"{data.get('size_m2', 'N/A')} m²" if data.get('size_m2') else "N/A")
@@ -309,24 +390,26 @@ if 'scraped_data' in st.session_state:
     info_col1, info_col2 = st.columns(2)
     
     with info_col1:
-        st.markdown(f'<div class="info-box"><strong>🏠 Tipo:</strong> {data.get("property_type", "N/A")}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-box"><strong>💼 Modalidade:</strong> {data.get("modality", "N/A")}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-box"><strong>🛏️ Suítes:</strong> {data.get("suites", "N/A") if data.get("suites") is not None else "N/A"}</div>', unsafe_allow_html=True)
         garage_value = data.get("garage")
-        st.markdown(f'<div class="info-box"><strong>🚗 Vagas:</strong> {garage_value if garage_value is not None else "N/A"}</div>', unsafe_allow_html=True)
+        render_info_boxes([
+            ("🏠 Tipo:", data.get("property_type", "N/A")),
+            ("💼 Modalidade:", data.get("modality", "N/A")),
+            ("🛏️ Suítes:", data.get("suites", "N/A") if data.get("suites") is not None else "N/A"),
+            ("🚗 Vagas:", garage_value if garage_value is not None else "N/A"),
+        ])
     
     with info_col2:
         location = data.get('location', {})
         city = location.get("city", "N/A")
-        st.markdown(f'<div class="info-box"><strong>📍 Cidade:</strong> {city}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-box"><strong>🏘️ Bairro:</strong> {location.get("neighborhood", "N/A")}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-box"><strong>🛣️ Endereço:</strong> {location.get("street", "N/A")}, {location.get("number", "")}</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-box"><strong>📮 CEP:</strong> {location.get("zipcode", "N/A")}</div>', unsafe_allow_html=True)
         map_link = location.get("map_link")
-        if map_link:
-            st.markdown(f'<div class="info-box"><strong>🗺️ Link da Localização:</strong> <a href="{map_link}" target="_blank" style="color: #1f77b4;">Ver no Mapa</a></div>', unsafe_allow_html=True)
-        else:
-            st.markdown(f'<div class="info-box"><strong>🗺️ Link da Localização:</strong> N/A</div>', unsafe_allow_html=True)
+        render_info_boxes([
+            ("📍 Cidade:", city),
+            ("🏘️ Bairro:", location.get("neighborhood", "N/A")),
+            ("🛣️ Endereço:", f'{location.get("street", "N/A")}, {location.get("number", "")}'),
+            ("📮 CEP:", location.get("zipcode", "N/A")),
+            ("🗺️ Link da Localização:",
+             f'<a href="{map_link}" target="_blank" style="color: #1f77b4;">Ver no Mapa</a>' if map_link else "N/A"),
+        ])
     
     # Códigos (advertiser e vivareal)
     if data.get('advertiser_code') or data.get('vivareal_code'):
@@ -348,7 +431,7 @@ if 'scraped_data' in st.session_state:
     images = data.get('images', [])
     if images:
         st.markdown(f"### 🖼️ Imagens ({len(images)} encontradas)")
-        # Mostra as primeiras 6 imagens em grid
+        # Mostra as primeiras 6 imagens em grid (o navegador do usuário as baixa direto da CDN)
         cols = st.columns(3)
         for idx, img_url in enumerate(images[:6]):
             with cols[idx % 3]:
@@ -358,11 +441,13 @@ if 'scraped_data' in st.session_state:
                     st.markdown(f"[Link da Imagem {idx + 1}]({img_url})")
         if len(images) > 6:
             with st.expander(f"Ver todas as {len(images)} imagens"):
-                for idx, img_url in enumerate(images[6:], start=7):
-                    try:
-                        st.image(img_url, use_container_width=True, caption=f"Imagem {idx}")
-                    except:
-                        st.markdown(f"[Link da Imagem {idx}]({img_url})")
+                # Carregamento lazy pelo navegador: não bloqueia a renderização inicial
+                gallery_html = ''.join(
+                    f'<figure style="margin: 0 0 1rem 0;"><img src="{html.escape(img_url, quote=True)}" loading="lazy" style="width: 100%;" alt="Imagem {idx}">'
+                    f'<figcaption style="text-align: center; color: #666;">Imagem {idx}</figcaption></figure>'
+                    for idx, img_url in enumerate(images[6:], start=7)
+                )
+                st.markdown(gallery_html, unsafe_allow_html=True)
     
     # Download do JSON
     st.markdown("---")
@@ -371,11 +456,11 @@ if 'scraped_data' in st.session_state:
     download_col1, download_col2 = st.columns(2)
     
     with download_col1:
-        json_str = json.dumps(data, ensure_ascii=False, indent=2)
-        property_id = data.get('url', '').split('-id-')[1].split('/')[0] if '-id-' in data.get('url', '') else 'data'
+        json_bytes = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        property_id = st.session_state.get('property_id') or property_id_of(data.get('url'), default='data')
         st.download_button(
             label="📥 Baixar JSON Atual",
-            data=json_str,
+            data=json_bytes,
             file_name=f"property_{property_id}.json",
             mime="application/json",
             use_container_width=True
@@ -384,17 +469,12 @@ if 'scraped_data' in st.session_state:
     with download_col2:
         # Botão para baixar todos os JSONs do histórico
         if 'scraping_history' in st.session_state and len(st.session_state['scraping_history']) > 0:
-            all_data = {
-                'total_properties': len(st.session_state['scraping_history']),
-                'exported_at': datetime.utcnow().isoformat() + 'Z',
-                'properties': [item['data'] for item in st.session_state['scraping_history']]
-            }
-            all_json_str = json.dumps(all_data, ensure_ascii=False, indent=2)
+            # O histórico em disco já é o arquivo de exportação (NDJSON, um imóvel por linha)
             st.download_button(
                 label=f"📦 Baixar Todos ({len(st.session_state['scraping_history'])} imóveis)",
-                data=all_json_str,
-                file_name=f"all_properties_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                mime="application/json",
+                data=history_store.read_bytes(),
+                file_name=f"all_properties_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                mime="application/x-ndjson",
                 use_container_width=True
             )
     
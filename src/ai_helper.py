@@ -1,9 +1,17 @@
 """Helper para usar API do ChatGPT para melhorar extração de dados."""
+import hashlib
 import logging
-import json
+import orjson
 import re
 import os
-from typing import Dict, List, Optional
+import threading
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+from bs4 import BeautifulSoup
+
+if TYPE_CHECKING:
+    from src.extractors import ParsedPage
 
 logger = logging.getLogger(__name__)
 
@@ -18,57 +26,231 @@ except ImportError:
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 
-def extract_images_with_ai(html_snippet: str, page_url: str) -> List[str]:
-    """
-    Estratégia 4: Usa IA para identificar URLs de imagens de imóveis no HTML.
-    Analisa HTML completo procurando padrões de URLs de imagens do Viva Real.
-    """
+@lru_cache(maxsize=1)
+def _get_client() -> Optional["OpenAI"]:
+    """Retorna um cliente OpenAI compartilhado (reaproveita o pool de conexões HTTP entre chamadas)."""
     if not OPENAI_AVAILABLE or not OPENAI_API_KEY:
-        logger.warning("OpenAI não disponível ou chave de API não configurada")
-        return []
+        return None
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+# Cache das respostas da IA, indexado pelo hash do HTML: retries e reruns da mesma página não pagam outra chamada
+_AI_CACHE_MAX_ENTRIES = 1024
+_ai_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_ai_cache_lock = threading.Lock()
+
+
+def _ai_cache_key(html_snippet: str, page_url: str, include_images: bool, include_location: bool) -> tuple:
+    """Monta a chave do cache a partir do conteúdo da página e das partes solicitadas."""
+    digest = hashlib.blake2b(html_snippet.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    return (digest, page_url, include_images, include_location)
+
+
+def _ai_cache_get(key: tuple) -> Optional[Dict]:
+    """Retorna uma cópia do resultado em cache (ou None), marcando-o como usado recentemente."""
+    with _ai_cache_lock:
+        cached = _ai_cache.get(key)
+        if cached is None:
+            return None
+        _ai_cache.move_to_end(key)
+    return {'images': list(cached['images']), 'location': dict(cached['location'])}
+
+
+def _ai_cache_put(key: tuple, result: Dict):
+    """Guarda o resultado, descartando o menos usado quando o limite é atingido."""
+    with _ai_cache_lock:
+        _ai_cache[key] = {'images': list(result['images']), 'location': dict(result['location'])}
+        _ai_cache.move_to_end(key)
+        while len(_ai_cache) > _AI_CACHE_MAX_ENTRIES:
+            _ai_cache.popitem(last=False)
+
+
+# Padrões de URLs de imagens (compilados uma única vez)
+# Uma só alternação cobre atributos src/data-src (grupo 1) e URLs absolutas soltas (grupo 2),
+# percorrendo o HTML uma vez em vez de três. Os grupos param antes da query string ("?"),
+# então as URLs já saem normalizadas
+_IMG_URL_RE = re.compile(
+    r'(?:data-)?src=["\']([^"\'?]*resizedimgs\.vivareal\.com[^"\'?]*\.(?:jpg|jpeg|png|webp))(?:\?[^"\']*)?["\']'
+    r'|(https?://[^"\'\s<>?]*resizedimgs\.vivareal\.com[^"\'\s<>?]*\.(?:jpg|jpeg|png|webp))',
+    re.IGNORECASE
+)
+_GENERAL_IMG_URL_RE = re.compile(r'https?://[^"\'\s<>?]*vivareal[^"\'\s<>?]*\.(?:jpg|jpeg|png|webp)', re.IGNORECASE)
+_LISTING_ID_RE = re.compile(r'vr-listing/([^/]+)/', re.IGNORECASE)
+_NOISE_IMG_RE = re.compile(r'avatar|logo|banner', re.IGNORECASE)
+# Mínimo de fotos do mesmo anúncio para dispensar o filtro da IA
+_CLEAN_GALLERY_MIN_IMAGES = 8
+
+# Elementos que costumam conter o endereço; só eles são enviados à IA para extrair localização
+_ADDRESS_SELECTORS = (
+    "title, h1, address, [itemprop*='address'], [class*='address'], [class*='Address'], "
+    "[class*='endereco'], [data-testid*='address'], [data-testid*='location']"
+)
+_ADDRESS_REGION_MAX_CHARS = 2000
+
+# JSON Schemas para structured outputs: a API garante uma resposta JSON válida neste formato
+IMAGES_SCHEMA = {
+    "type": "array",
+    "items": {"type": "string"},
+}
+LOCATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "city": {"type": ["string", "null"]},
+        "neighborhood": {"type": ["string", "null"]},
+        "street": {"type": ["string", "null"]},
+        "number": {"type": ["string", "null"]},
+        "zipcode": {"type": ["string", "null"]},
+        "map_link": {"type": ["string", "null"]},
+    },
+    "required": ["city", "neighborhood", "street", "number", "zipcode", "map_link"],
+    "additionalProperties": False,
+}
+
+
+def _find_candidate_image_urls(html_snippet: str) -> List[str]:
+    """Extrai do HTML, via regex, as URLs de imagens do Viva Real que serão enviadas para a IA."""
+    # Percorre o HTML uma única vez; finditer entrega as URLs sob demanda, sem listas intermediárias
+    all_urls = (match.group(1) or match.group(2) for match in _IMG_URL_RE.finditer(html_snippet))
+    
+    # Remove duplicatas preservando a ordem
+    vivareal_urls = list(dict.fromkeys(url for url in all_urls if 'vr-listing' in url.lower()))
     
+    if not vivareal_urls:
+        # Tenta buscar padrões mais gerais
+        vivareal_urls = list(dict.fromkeys(
+            url for url in (match.group(0) for match in _GENERAL_IMG_URL_RE.finditer(html_snippet))
+            if 'vr-listing' in (url_lower := url.lower()) or '/img/' in url_lower
+        ))
+    
+    # Limita a 30 URLs para não usar muitos tokens
+    return vivareal_urls[:30]
+
+
+def _is_clean_gallery(urls: List[str]) -> bool:
+    """
+    Indica se as URLs encontradas por regex já formam a galeria de um único anúncio
+    (vários vr-listing/<id> iguais, sem logos/banners/avatares), caso em que a IA é dispensável.
+    """
+    if len(urls) < _CLEAN_GALLERY_MIN_IMAGES:
+        return False
+    listing_ids = Counter()
+    for url in urls:
+        if _NOISE_IMG_RE.search(url):
+            return False
+        match = _LISTING_ID_RE.search(url)
+        if not match:
+            return False
+        listing_ids[match.group(1)] += 1
+    return len(listing_ids) == 1
+
+
+def _extract_address_region(html: str, soup: Optional[BeautifulSoup] = None) -> str:
+    """
+    Reduz o HTML aos elementos relacionados a endereço (título, h1, address, etc.).
+    Scripts, estilos e navegação não chegam à IA: menos tokens e mais sinal para a extração.
+    Se soup for informado (o da ParsedPage do scraper), o HTML não é parseado de novo.
+    """
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Extrai todas as URLs de imagens do HTML primeiro usando regex mais abrangente
-        img_urls_pattern = r'https?://[^"\'\s<>]*resizedimgs\.vivareal\.com[^"\'\s<>]*\.(?:jpg|jpeg|png|webp)'
-        data_src_pattern = r'data-src=["\']([^"\']*resizedimgs\.vivareal\.com[^"\']*\.(?:jpg|jpeg|png|webp))["\']'
-        src_pattern = r'src=["\']([^"\']*resizedimgs\.vivareal\.com[^"\']*\.(?:jpg|jpeg|png|webp))["\']'
-        
-        all_urls = re.findall(img_urls_pattern, html_snippet, re.IGNORECASE)
-        all_urls.extend(re.findall(data_src_pattern, html_snippet, re.IGNORECASE))
-        all_urls.extend(re.findall(src_pattern, html_snippet, re.IGNORECASE))
-        
-        # Remove duplicatas e limpa URLs
+        if soup is None:
+            soup = BeautifulSoup(html, 'lxml')
+        parts = []
+        selected = set()
+        total = 0
+        for element in soup.select(_ADDRESS_SELECTORS):
+            # Ignora elementos contidos em outro já selecionado
+            if any(id(parent) in selected for parent in element.parents):
+                continue
+            parts.append(element)
+            selected.add(id(element))
+            total += len(str(element))
+            if total >= _ADDRESS_REGION_MAX_CHARS:
+                break
+        return "\n".join(str(part) for part in parts)[:_ADDRESS_REGION_MAX_CHARS]
+    except Exception as e:
+        logger.debug(f"Erro ao isolar região de endereço do HTML: {e}")
+        return ""
+
+
+def _clean_ai_images(images) -> List[str]:
+    """Filtra apenas URLs válidas e adiciona protocolo se necessário."""
+    if not isinstance(images, list):
+        return []
+    valid_images = []
+    for img in images:
+        if isinstance(img, str) and img.startswith('http'):
+            valid_images.append(img)
+        elif isinstance(img, str) and img.startswith('//'):
+            valid_images.append('https:' + img)
+    return valid_images[:15]  # Limita a 15
+
+
+def _clean_ai_location(location) -> Dict[str, Optional[str]]:
+    """Garante que map_link seja do Google Maps, construindo-o a partir do endereço se necessário."""
+    if not isinstance(location, dict):
+        return {}
+    if location.get('map_link') and 'google.com/maps' not in location.get('map_link', ''):
+        # Se não for Google Maps, pode tentar construir
+        if location.get('street') and location.get('city'):
+            address_parts = []
+            if location.get('street'):
+                address_parts.append(location['street'])
+            if location.get('number'):
+                address_parts.append(location['number'])
+            if location.get('neighborhood'):
+                address_parts.append(location['neighborhood'])
+            if location.get('city'):
+                address_parts.append(location['city'])
+            if len(address_parts) >= 2:
+                full_address = ', '.join([part for part in address_parts if part])
+                location['map_link'] = f"https://www.google.com/maps/search/?api=1&query={full_address.replace(' ', '+')}"
+    return location
+
+
+def extract_ai_combined(html_snippet: str, page_url: str,
+                        include_images: bool = True, include_location: bool = True,
+                        soup: Optional[BeautifulSoup] = None) -> Dict:
+    """
+    Extrai as partes pedidas (imagens e/ou localização) com uma única chamada à IA.
+    Quando as duas são pedidas, o HTML é enviado (e tokenizado) uma só vez e a página paga apenas um round-trip à API.
+    soup, se informado, deve ser o parse de html_snippet e é usado para isolar a região de endereço.
+    Retorna {'images': [...], 'location': {...}}; as partes não solicitadas ou não encontradas ficam vazias.
+    """
+    combined = {'images': [], 'location': {}}
+    vivareal_urls = _find_candidate_image_urls(html_snippet[:30000]) if include_images else []
+    if vivareal_urls and _is_clean_gallery(vivareal_urls):
+        # Regex já isolou a galeria do anúncio: não gasta uma chamada à IA para filtrá-la
+        combined['images'] = _clean_ai_images(vivareal_urls)
+        logger.info(f"Galeria identificada por regex ({len(combined['images'])} imagens), filtro da IA dispensado")
         vivareal_urls = []
-        seen = set()
-        for url in all_urls:
-            # Remove parâmetros de query para normalizar
-            clean_url = url.split('?')[0] if '?' in url else url
-            if clean_url not in seen and 'vr-listing' in clean_url.lower():
-                vivareal_urls.append(clean_url)
-                seen.add(clean_url)
-        
-        if not vivareal_urls:
-            # Tenta buscar padrões mais gerais
-            general_pattern = r'https?://[^"\'\s<>]*vivareal[^"\'\s<>]*\.(?:jpg|jpeg|png|webp)'
-            all_general = re.findall(general_pattern, html_snippet, re.IGNORECASE)
-            for url in all_general:
-                clean_url = url.split('?')[0] if '?' in url else url
-                if clean_url not in seen and ('vr-listing' in clean_url.lower() or '/img/' in clean_url.lower()):
-                    vivareal_urls.append(clean_url)
-                    seen.add(clean_url)
-        
-        if not vivareal_urls:
-            return []
-        
-        # Limita a 30 URLs para não usar muitos tokens
-        vivareal_urls = vivareal_urls[:30]
-        
+    include_images = bool(vivareal_urls)
+    if not include_images and not include_location:
+        return combined
+    
+    client = _get_client()
+    if client is None:
+        logger.warning("OpenAI não disponível ou chave de API não configurada")
+        return combined
+    
+    cache_key = _ai_cache_key(html_snippet, page_url, include_images, include_location)
+    cached = _ai_cache_get(cache_key)
+    if cached is None and include_images != include_location:
+        # Uma resposta combinada da mesma página também atende um pedido de uma só parte
+        cached = _ai_cache_get(cache_key[:2] + (True, True))
+        if cached is not None:
+            if not include_images:
+                cached['images'] = combined['images']
+            if not include_location:
+                cached['location'] = {}
+    if cached is not None:
+        logger.info("Resultado da IA reaproveitado do cache")
+        return cached
+    
+    sections = []
+    properties = {}
+    if include_images:
         # Cria lista de URLs para análise
         urls_text = "\n".join([f"- {url}" for url in vivareal_urls[:25]])
-        
-        prompt = f"""Analise estas URLs de imagens de uma página de imóvel do Viva Real e retorne APENAS as URLs que são FOTOS REAIS DO IMÓVEL.
+        sections.append(f"""IMAGENS: Analise estas URLs de imagens da página e selecione APENAS as URLs que são FOTOS REAIS DO IMÓVEL.
 
 URLs encontradas:
 {urls_text}
@@ -81,53 +263,89 @@ EXCLUA URLs que contenham:
 INCLUA APENAS URLs que sejam:
 - Fotos do imóvel (interior/exterior)
 - Da galeria de fotos
-- Com boa resolução
+- Com boa resolução""")
+        properties['images'] = IMAGES_SCHEMA
+    if include_location:
+        # Envia só a região de endereço; se nada for encontrado, cai no trecho inicial do HTML
+        address_html = _extract_address_region(html_snippet, soup) or html_snippet[:8000]
+        sections.append(f"""LOCALIZAÇÃO: Analise este HTML e extraia informações de localização precisas.
 
-Retorne APENAS um JSON array com as URLs válidas:
-["url1", "url2"]
-"""
+HTML:
+{address_html}
+
+Extraia:
+- Cidade (nome completo, ex: "São Luís" não apenas "São")
+- Bairro
+- Rua/Avenida (endereço completo)
+- Número
+- CEP (se disponível)
+- Link do Google Maps ou coordenadas (se disponível)
+
+Use null para as informações de localização não encontradas.""")
+        properties['location'] = LOCATION_SCHEMA
+    
+    sections_text = "\n\n".join(sections)
+    prompt = f"""Analise esta página de imóvel do Viva Real.
+
+URL da página: {page_url}
 
+{sections_text}
+"""
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "property_extraction",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        },
+    }
+    
+    try:
         response = client.chat.completions.create(
             model="gpt-4o-mini",  # Modelo mais barato
             messages=[
-                {"role": "system", "content": "Você é um especialista em web scraping. Retorne apenas JSON válido."},
+                {"role": "system", "content": "Você é um especialista em web scraping e extração de dados."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=2000
+            max_tokens=2000,
+            response_format=response_format
         )
         
-        result = response.choices[0].message.content.strip()
+        content = response.choices[0].message.content
+        if not content:
+            logger.warning("IA não retornou conteúdo (resposta recusada ou truncada)")
+            return combined
         
-        # Tenta parsear o JSON
-        # Remove markdown code blocks se houver
-        if result.startswith("```"):
-            result = result.split("```")[1]
-            if result.startswith("json"):
-                result = result[4:]
-            result = result.strip()
-        if result.endswith("```"):
-            result = result.rsplit("```", 1)[0].strip()
+        parsed = orjson.loads(content)
+        if include_images:
+            combined['images'] = _clean_ai_images(parsed.get('images'))
+            logger.info(f"IA encontrou {len(combined['images'])} imagens válidas")
+        if include_location:
+            combined['location'] = _clean_ai_location(parsed.get('location'))
+            if combined['location']:
+                logger.info("IA extraiu localização com sucesso")
         
-        images = json.loads(result)
-        if isinstance(images, list):
-            # Filtra apenas URLs válidas e adiciona protocolo se necessário
-            valid_images = []
-            for img in images:
-                if isinstance(img, str) and img.startswith('http'):
-                    valid_images.append(img)
-                elif isinstance(img, str) and img.startswith('//'):
-                    valid_images.append('https:' + img)
-            logger.info(f"IA encontrou {len(valid_images)} imagens válidas")
-            return valid_images[:15]  # Limita a 15
+        # Só respostas bem-sucedidas entram no cache, para que falhas possam ser refeitas
+        _ai_cache_put(cache_key, combined)
         
-    except json.JSONDecodeError as e:
-        logger.warning(f"Erro ao parsear resposta da IA: {e}")
-        logger.debug(f"Resposta recebida: {result[:200] if 'result' in locals() else 'N/A'}")
     except Exception as e:
-        logger.warning(f"Erro ao usar IA para extrair imagens: {e}")
+        logger.warning(f"Erro ao usar IA para extrair dados: {e}")
     
-    return []
+    return combined
+
+
+def extract_images_with_ai(html_snippet: str, page_url: str) -> List[str]:
+    """
+    Estratégia 4: Usa IA para identificar URLs de imagens de imóveis no HTML.
+    Analisa HTML completo procurando padrões de URLs de imagens do Viva Real.
+    """
+    return extract_ai_combined(html_snippet, page_url, include_location=False)['images']
 
 
 def extract_location_with_ai(html_snippet: str, page_url: str) -> Dict[str, Optional[str]]:
@@ -135,83 +353,51 @@ def extract_location_with_ai(html_snippet: str, page_url: str) -> Dict[str, Opti
     Usa IA para extrair informações de localização mais precisas.
     Retorna dicionário com localização.
     """
-    if not OPENAI_AVAILABLE or not OPENAI_API_KEY:
-        return {}
-    
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        prompt = f"""Analise este HTML de uma página de imóvel do Viva Real e extraia informações de localização precisas.
+    return extract_ai_combined(html_snippet, page_url, include_images=False)['location']
 
-URL da página: {page_url}
 
-HTML:
-{html_snippet[:8000]}
+class PageAIExtractor:
+    """
+    Executa os fallbacks de IA de uma página (localização e imagens) com o menor número de chamadas.
+    extract_location agenda a localização com defer_location(); se extract_images precisar da IA,
+    as duas partes vão numa única chamada. Senão, resolve() pede só a localização, e imagens
+    nunca entram no prompt sem que extract_images as tenha pedido.
+    Se page for informada, a região de endereço é lida do soup já parseado pelo scraper.
+    """
 
-Extraia:
-- Cidade (nome completo, ex: "São Luís" não apenas "São")
-- Bairro
-- Rua/Avenida (endereço completo)
-- Número
-- CEP (se disponível)
-- Link do Google Maps ou coordenadas (se disponível)
+    def __init__(self, page_source: str, page_url: str, page: Optional["ParsedPage"] = None):
+        self.page_source = page_source
+        self.page_url = page_url
+        self.page = page
+        self._images: Optional[List[str]] = None
+        self._pending_location: Optional[Callable[[Dict[str, Optional[str]]], None]] = None
 
-Retorne APENAS um JSON com esta estrutura:
-{{
-  "city": "nome da cidade completo",
-  "neighborhood": "nome do bairro",
-  "street": "nome da rua/avenida",
-  "number": "número",
-  "zipcode": "CEP ou null",
-  "map_link": "URL do Google Maps válida ou null"
-}}
-"""
+    def defer_location(self, apply: Callable[[Dict[str, Optional[str]]], None]):
+        """Agenda o fallback de localização; apply recebe a localização da IA quando a chamada for feita."""
+        self._pending_location = apply
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Você é um especialista em extração de dados. Retorne apenas JSON válido."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        result = response.choices[0].message.content.strip()
-        
-        # Remove markdown se houver
-        if result.startswith("```"):
-            result = result.split("```")[1]
-            if result.startswith("json"):
-                result = result[4:]
-            result = result.strip()
-        if result.endswith("```"):
-            result = result.rsplit("```", 1)[0].strip()
-        
-        location = json.loads(result)
-        if isinstance(location, dict):
-            logger.info("IA extraiu localização com sucesso")
-            # Garante que map_link seja do Google Maps se existir
-            if location.get('map_link') and 'google.com/maps' not in location.get('map_link', ''):
-                # Se não for Google Maps, pode tentar construir
-                if location.get('street') and location.get('city'):
-                    address_parts = []
-                    if location.get('street'):
-                        address_parts.append(location['street'])
-                    if location.get('number'):
-                        address_parts.append(location['number'])
-                    if location.get('neighborhood'):
-                        address_parts.append(location['neighborhood'])
-                    if location.get('city'):
-                        address_parts.append(location['city'])
-                    if len(address_parts) >= 2:
-                        full_address = ', '.join([part for part in address_parts if part])
-                        location['map_link'] = f"https://www.google.com/maps/search/?api=1&query={full_address.replace(' ', '+')}"
-            return location
-        
-    except json.JSONDecodeError as e:
-        logger.warning(f"Erro ao parsear localização da IA: {e}")
-    except Exception as e:
-        logger.warning(f"Erro ao usar IA para extrair localização: {e}")
-    
-    return {}
+    def images(self) -> List[str]:
+        """Retorna as URLs de imagens selecionadas pela IA, atendendo na mesma chamada a localização agendada."""
+        if self._images is None:
+            include_location = self._pending_location is not None
+            self._images = self._request(include_images=True, include_location=include_location)['images']
+        return self._images
+
+    def resolve(self):
+        """Faz a chamada só de localização se ela foi agendada e não saiu junto com as imagens."""
+        if self._pending_location is not None:
+            self._request(include_images=False, include_location=True)
+
+    def _request(self, include_images: bool, include_location: bool) -> Dict:
+        if include_location:
+            logger.info("Tentando usar IA para melhorar localização...")
+        soup = self.page.soup if include_location and self.page is not None else None
+        result = extract_ai_combined(self.page_source, self.page_url, include_images=include_images,
+                                     include_location=include_location, soup=soup)
+        if include_location:
+            apply, self._pending_location = self._pending_location, None
+            try:
+                apply(result['location'])
+            except Exception as e:
+                logger.debug(f"Erro ao usar IA para localização: {e}")
+        return result
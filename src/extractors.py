@@ -1,18 +1,186 @@
 """Funções para extrair dados específicos das páginas do Viva Real."""
 import re
+import html
 import json
 import time
 import logging
-from typing import Dict, Optional, List
+from concurrent.futures import Executor, Future
+from functools import cached_property
+from urllib.parse import quote_plus
+from typing import Dict, Iterator, Optional, List, Tuple, TYPE_CHECKING
+import orjson
+from lxml import etree
 from bs4 import BeautifulSoup
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 
+if TYPE_CHECKING:
+    from src.ai_helper import PageAIExtractor
+
 logger = logging.getLogger(__name__)
 
+# Padrões compilados uma única vez, no import do módulo
+_PROPERTY_TYPES = ['Apartamento', 'Casa', 'Cobertura', 'Terreno',
+                   'Sobrado', 'Kitnet', 'Studio', 'Loft', 'Sala']
+# Uma única busca pela alternação em vez de uma busca de substring por tipo; o grupo casado
+# (em minúsculas) é mapeado de volta para o nome canônico
+_PROP_TYPE_CANON = {prop_type.lower(): prop_type for prop_type in _PROPERTY_TYPES}
+_RE_PROP_TYPE = re.compile(r'\b(' + '|'.join(_PROP_TYPE_CANON) + r')', re.IGNORECASE)
+_RE_TITLE = re.compile(r'<title[^>]*>([^<]+)</title>', re.IGNORECASE)
+_RE_PRICE = re.compile(r'R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)')
+# "1.234.567,89" -> "1234567.89" em uma única passada
+_BRL_TO_FLOAT = str.maketrans({'.': None, ',': '.'})
+# Todas as características numéricas em uma só alternação: o texto é percorrido uma única vez
+# e o grupo nomeado que casou indica o campo
+_RE_FEATURES = re.compile(
+    r'(?P<size_m2>\d+)\s*m[²2]|(?P<bedrooms>\d+)\s*quarto|(?P<bathrooms>\d+)\s*banheiro'
+    r'|(?P<garage>\d+)\s*(?:vaga|garagem)|garagem[:\s]*(?P<garage_alt>\d+)',
+    re.IGNORECASE
+)
+_CHARACTERISTIC_FIELDS = ('size_m2', 'bedrooms', 'bathrooms', 'suites', 'garage')
+_FEATURE_FIELDS = {'size_m2': 'size_m2', 'bedrooms': 'bedrooms', 'bathrooms': 'bathrooms',
+                   'garage': 'garage', 'garage_alt': 'garage'}
+_RE_CITY_STRICT = re.compile(r'em\s+([A-ZÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ][a-záàâãéèêíìîóòôõúùûç\s]+?)(?:,|\s*-\s*|$)', re.IGNORECASE)  # Cidade com capital inicial
+_RE_CITY_FALLBACK = re.compile(r'em\s+([^,]+?)(?:,|$)', re.IGNORECASE)
+# Vírgulas, pontos, hífens e espaços removidos do fim do nome da cidade
+_TRAIL_PUNCT = ',.-' + ' \t\n\r\f\v\xa0'
+_RE_ADDRESS = re.compile(r'na\s+([^,]+?),\s*(\d+),\s*([^,]+?)\s+em', re.IGNORECASE)
+_RE_CITY_ALPHA = re.compile(r'^[A-Za-záàâãéèêíìîóòôõúùûç\s]+$')
+_RE_ADV_CODE = re.compile(r'Código\s+do\s+anunciante[:\s]*([A-Z0-9]+)', re.IGNORECASE)
+_RE_VR_CODE = re.compile(r'Código\s+(?:no\s+)?Viva\s+Real[:\s]*(\d+)', re.IGNORECASE)
+_RE_ID_URL = re.compile(r'-id-(\d+)')
+# Cabeçalhos de seção descartados das linhas da descrição
+_RE_DESCRIPTION_HEADER = re.compile(r'descrição|características', re.IGNORECASE)
+# Janelas para varrer o texto da página sem materializar soup.get_text() inteiro
+_TEXT_WINDOW_CHARS = 16384
+_TEXT_WINDOW_OVERLAP = 512
+# Classificação das URLs de imagem capturadas na rede: uma busca por grupo de palavras-chave
+_RE_IMG_DOMAIN = re.compile(r'resizedimgs\.vivareal\.com|vivareal\.com\.br/img')
+_RE_IMG_EXCLUDE = re.compile(r'logo|banner|icon|avatar|profile|corretor|agent|mota-fonseca|thumbnail|placeholder')
+_RE_IMG_LISTING = re.compile(r'vr-listing', re.IGNORECASE)
+# Filtro das imagens lidas do DOM, aplicado direto na URL original (sem criar a cópia em minúsculas)
+_RE_IMG_REJECT = re.compile(r'logo|banner|icon|avatar|profile', re.IGNORECASE)
+# Scripts executados no navegador para ler vários elementos em uma única chamada ao WebDriver
+_JS_IMAGE_URLS = (
+    "return Array.from(document.querySelectorAll(arguments[0]))"
+    ".map(e => e.currentSrc || e.src || e.getAttribute('data-src') || e.getAttribute('data-lazy-src'))"
+    ".filter(Boolean);"
+)
+_JS_XPATH_TEXTS = (
+    "const r = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);"
+    "const texts = [];"
+    "for (let i = 0; i < r.snapshotLength; i++) { texts.push(r.snapshotItem(i).innerText || ''); }"
+    "return texts;"
+)
+# Roda sobre o HTML bruto: além de aspas e espaços, "&", "<" e ">" encerram a URL, para que
+# JSON em atributos (&quot;...&quot;) e marcações vizinhas não colem duas URLs em uma
+_RE_SCRIPT_IMAGE_URL = re.compile(
+    r'https?://[^"\'\s&<>]*resizedimgs\.vivareal\.com[^"\'\s&<>]*vr-listing[^"\'\s&<>]*\.(?:jpg|jpeg|png|webp)',
+    re.IGNORECASE
+)
+
+
+class ParsedPage:
+    """
+    HTML de uma página parseado uma única vez e compartilhado entre os extratores,
+    evitando que cada extract_* refaça o BeautifulSoup do mesmo page_source.
+    O título é lido por regex; o BeautifulSoup só é construído quando algum extrator precisa dele.
+    Se url for informada, os extratores a usam no lugar de driver.current_url (uma chamada ao WebDriver).
+    Se executor for informado, o BeautifulSoup é montado em segundo plano enquanto os extratores
+    que dependem do navegador aguardam o WebDriver.
+    """
+
+    def __init__(self, page_source: str, url: Optional[str] = None, executor: Optional[Executor] = None):
+        self.page_source = page_source
+        self.url = url
+        title_match = _RE_TITLE.search(page_source)
+        self.title_text = html.unescape(title_match.group(1)) if title_match else None
+        self.title_text_lower = self.title_text.lower() if self.title_text is not None else None
+        self._soup_future: Optional[Future] = (
+            executor.submit(BeautifulSoup, page_source, 'lxml') if executor is not None else None
+        )
+
+    @cached_property
+    def soup(self) -> BeautifulSoup:
+        if self._soup_future is not None:
+            return self._soup_future.result()
+        return BeautifulSoup(self.page_source, 'lxml')
+
+    @cached_property
+    def json_ld_texts(self) -> List[str]:
+        """
+        Textos dos scripts JSON-LD da página.
+        Reaproveita o soup se ele já foi construído; senão lê direto com o parser HTML do lxml,
+        sem montar a árvore de objetos do BeautifulSoup só para isso.
+        """
+        if 'soup' in self.__dict__ or self._soup_future is not None:
+            texts = [script.string for script in self.soup.find_all('script', type='application/ld+json')]
+        else:
+            # Parser por chamada (parsers do lxml não devem ser compartilhados entre threads);
+            # sem índice de ids nem nós de texto vazios, que a busca por scripts não usa.
+            # O HTML vai como bytes UTF-8: o lxml recusa str com declaração <?xml ... encoding=...?>
+            parser = etree.HTMLParser(encoding='utf-8', collect_ids=False, remove_blank_text=True)
+            tree = etree.fromstring(self.page_source.encode('utf-8', 'replace'), parser)
+            if tree is None:  # Documento vazio ou só com espaços
+                return []
+            texts = tree.xpath('//script[@type="application/ld+json"]/text()', smart_strings=False)
+        return [text for text in texts if text]
+
+
+def _iter_text_windows(soup: BeautifulSoup) -> Iterator[Tuple[str, int]]:
+    """
+    Percorre o texto da página (o mesmo de soup.get_text()) em janelas de ~16 KB, permitindo parar cedo.
+    Gera (texto, limite): só valem matches que terminam até o limite; os demais reaparecem
+    inteiros na janela seguinte, que repete o final da anterior.
+    """
+    parts = []
+    size = 0
+    tail = ''
+    for string in soup.strings:
+        parts.append(string)
+        size += len(string)
+        if size >= _TEXT_WINDOW_CHARS:
+            window = tail + ''.join(parts)
+            yield window, len(window) - _TEXT_WINDOW_OVERLAP
+            tail = window[-2 * _TEXT_WINDOW_OVERLAP:]
+            parts = []
+            size = 0
+    window = tail + ''.join(parts)
+    yield window, len(window)
+
+
+def _fill_features(text: str, result: Dict[str, Optional[int]], limit: Optional[int] = None) -> bool:
+    """
+    Preenche em result os campos ainda vazios (tamanho, quartos, banheiros, vagas)
+    com a primeira ocorrência de cada um no texto, em uma única passada de _RE_FEATURES.
+    Ignora matches que terminam depois de limit. Retorna True quando não resta campo vazio.
+    """
+    pending = {field for field in _FEATURE_FIELDS.values() if not result.get(field)}
+    for match in _RE_FEATURES.finditer(text):
+        if not pending or (limit is not None and match.end() > limit):
+            break
+        field = _FEATURE_FIELDS[match.lastgroup]
+        if field in pending:
+            result[field] = int(match.group(match.lastgroup))
+            pending.discard(field)
+    return not pending
+
+
+def _build_map_link(location: Dict[str, Optional[str]]) -> Optional[str]:
+    """Monta um link de busca do Google Maps com as partes do endereço (precisa de pelo menos 2)."""
+    address_parts = [location.get('street'), location.get('number'), location.get('neighborhood')]
+    if location.get('city') != 'São':  # Evita usar cidade incompleta
+        address_parts.append(location.get('city'))
+    address_parts = [part for part in address_parts if part]
+    if len(address_parts) < 2:
+        return None
+    google_maps_url = f"https://www.google.com/maps/search/?api=1&query={quote_plus(', '.join(address_parts))}"
+    logger.info(f"Google Maps gerado do endereço: {google_maps_url}")
+    return google_maps_url
+
 
-def extract_property_type(driver: WebDriver, page_source: str) -> Optional[str]:
+def extract_property_type(driver: WebDriver, page_source: str, page: Optional[ParsedPage] = None) -> Optional[str]:
     """Extrai o tipo do imóvel (Apartamento, Casa, etc.)."""
     if not page_source or len(page_source) < 100:
         logger.warning("page_source vazio ou muito pequeno para extrair tipo do imóvel")
@@ -20,25 +188,22 @@ def extract_property_type(driver: WebDriver, page_source: str) -> Optional[str]:
     
     try:
         logger.debug("Iniciando extração de tipo do imóvel")
-        soup = BeautifulSoup(page_source, 'lxml')
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
-            property_types = ['Apartamento', 'Casa', 'Cobertura', 'Terreno', 
-                            'Sobrado', 'Kitnet', 'Studio', 'Loft', 'Sala']
-            for prop_type in property_types:
-                if prop_type.lower() in title_text.lower():
-                    logger.debug(f"Tipo do imóvel encontrado no título: {prop_type}")
-                    return prop_type
+        page = page or ParsedPage(page_source)
+        if page.title_text is not None:
+            match = _RE_PROP_TYPE.search(page.title_text)
+            if match:
+                prop_type = _PROP_TYPE_CANON[match.group(1).lower()]
+                logger.debug(f"Tipo do imóvel encontrado no título: {prop_type}")
+                return prop_type
         try:
             breadcrumb_items = driver.find_elements(By.CSS_SELECTOR, "nav[aria-label='Breadcrumb'] a, nav[name='Breadcrumb'] a")
             logger.debug(f"Encontrados {len(breadcrumb_items)} itens de breadcrumb")
             for item in breadcrumb_items:
-                text = item.text.strip()
-                for prop_type in property_types:
-                    if prop_type.lower() in text.lower():
-                        logger.debug(f"Tipo do imóvel encontrado no breadcrumb: {prop_type}")
-                        return prop_type
+                match = _RE_PROP_TYPE.search(item.text)
+                if match:
+                    prop_type = _PROP_TYPE_CANON[match.group(1).lower()]
+                    logger.debug(f"Tipo do imóvel encontrado no breadcrumb: {prop_type}")
+                    return prop_type
         except Exception as e:
             logger.debug(f"Erro ao buscar breadcrumb: {e}")
         logger.debug("Tipo do imóvel não encontrado")
@@ -47,7 +212,7 @@ def extract_property_type(driver: WebDriver, page_source: str) -> Optional[str]:
     return None
 
 
-def extract_modality(driver: WebDriver, page_source: str) -> Optional[str]:
+def extract_modality(driver: WebDriver, page_source: str, page: Optional[ParsedPage] = None) -> Optional[str]:
     """Extrai a modalidade (Venda ou Aluguel)."""
     if not page_source or len(page_source) < 100:
         logger.warning("page_source vazio ou muito pequeno para extrair modalidade")
@@ -55,25 +220,25 @@ def extract_modality(driver: WebDriver, page_source: str) -> Optional[str]:
     
     try:
         logger.debug("Iniciando extração de modalidade")
-        soup = BeautifulSoup(page_source, 'lxml')
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
-            if 'venda' in title_text.lower() or 'por r$' in title_text.lower():
-                return 'Venda'
-            elif 'aluguel' in title_text.lower() or 'alugar' in title_text.lower():
-                return 'Aluguel'
-        current_url = driver.current_url
-        if '/venda/' in current_url.lower():
+        # A URL é conclusiva quando traz o segmento da modalidade; o título fica como fallback
+        current_url_lower = ((page.url if page is not None else None) or driver.current_url).lower()
+        if '/venda/' in current_url_lower:
             return 'Venda'
-        elif '/aluguel/' in current_url.lower():
+        elif '/aluguel/' in current_url_lower:
             return 'Aluguel'
+        page = page or ParsedPage(page_source)
+        title_text_lower = page.title_text_lower
+        if title_text_lower is not None:
+            if 'venda' in title_text_lower or 'por r$' in title_text_lower:
+                return 'Venda'
+            elif 'aluguel' in title_text_lower or 'alugar' in title_text_lower:
+                return 'Aluguel'
     except Exception as e:
         logger.warning(f"Erro ao extrair modalidade: {e}")
     return None
 
 
-def extract_price(driver: WebDriver, page_source: str) -> Optional[float]:
+def extract_price(driver: WebDriver, page_source: str, page: Optional[ParsedPage] = None) -> Optional[float]:
     """Extrai o preço do imóvel."""
     if not page_source or len(page_source) < 100:
         logger.warning("page_source vazio ou muito pequeno para extrair preço")
@@ -81,13 +246,12 @@ def extract_price(driver: WebDriver, page_source: str) -> Optional[float]:
     
     try:
         logger.debug("Iniciando extração de preço")
-        soup = BeautifulSoup(page_source, 'lxml')
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
-            price_match = re.search(r'R\$\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)', title_text)
+        page = page or ParsedPage(page_source)
+        title_text = page.title_text
+        if title_text is not None:
+            price_match = _RE_PRICE.search(title_text)
             if price_match:
-                price_str = price_match.group(1).replace('.', '').replace(',', '.')
+                price_str = price_match.group(1).translate(_BRL_TO_FLOAT)
                 try:
                     return float(price_str)
                 except ValueError:
@@ -97,130 +261,84 @@ def extract_price(driver: WebDriver, page_source: str) -> Optional[float]:
     return None
 
 
-def extract_characteristics(driver: WebDriver, page_source: str) -> Dict[str, Optional[int]]:
+def extract_characteristics(driver: WebDriver, page_source: str,
+                            page: Optional[ParsedPage] = None) -> Dict[str, Optional[int]]:
     """Extrai características do imóvel (tamanho, quartos, banheiros, etc.)."""
+    return extract_characteristics_into(driver, page_source, {}, page=page)
+
+
+def extract_characteristics_into(driver: WebDriver, page_source: str, result: Dict,
+                                 page: Optional[ParsedPage] = None) -> Dict:
+    """
+    Igual a extract_characteristics, mas grava os campos diretamente em result (por exemplo,
+    o registro do imóvel que está sendo montado) em vez de criar um dicionário novo. Retorna result.
+    """
+    result.update(dict.fromkeys(_CHARACTERISTIC_FIELDS))
     if not page_source or len(page_source) < 100:
         logger.warning("page_source vazio ou muito pequeno para extrair características")
-        return {'size_m2': None, 'bedrooms': None, 'suites': None, 'bathrooms': None, 'garage': None}
+        return result
     
     logger.debug("Iniciando extração de características")
-    """Extrai características do imóvel."""
-    result = {'size_m2': None, 'bedrooms': None, 'bathrooms': None, 'suites': None, 'garage': None}
     try:
-        soup = BeautifulSoup(page_source, 'lxml')
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
-            size_match = re.search(r'(\d+)\s*m[²2]', title_text, re.IGNORECASE)
-            if size_match:
-                try:
-                    result['size_m2'] = int(size_match.group(1))
-                except ValueError:
-                    pass
-            bedrooms_match = re.search(r'(\d+)\s*quarto', title_text, re.IGNORECASE)
-            if bedrooms_match:
-                try:
-                    result['bedrooms'] = int(bedrooms_match.group(1))
-                except ValueError:
-                    pass
-            bathrooms_match = re.search(r'(\d+)\s*banheiro', title_text, re.IGNORECASE)
-            if bathrooms_match:
-                try:
-                    result['bathrooms'] = int(bathrooms_match.group(1))
-                except ValueError:
-                    pass
-            # Procura por vagas no título
-            garage_match = re.search(r'(\d+)\s*vaga', title_text, re.IGNORECASE)
-            if garage_match:
-                try:
-                    result['garage'] = int(garage_match.group(1))
-                except ValueError:
-                    pass
+        page = page or ParsedPage(page_source)
+        if page.title_text is not None:
+            _fill_features(page.title_text, result)
         
-        # Procura nos elementos da página
-        try:
-            # Procura por lista de características
-            feature_elements = driver.find_elements(By.CSS_SELECTOR, 
-                "li, [class*='feature'], [class*='characteristic'], [data-testid*='feature']")
-            for element in feature_elements:
-                text = element.text.strip().lower()
-                # Vagas
-                if not result['garage']:
-                    garage_patterns = [r'(\d+)\s*vaga', r'(\d+)\s*garagem', r'garagem[:\s]*(\d+)']
-                    for pattern in garage_patterns:
-                        match = re.search(pattern, text, re.IGNORECASE)
-                        if match:
-                            try:
-                                result['garage'] = int(match.group(1))
-                                break
-                            except ValueError:
-                                pass
-        except Exception:
-            pass
-        
-        body_text = soup.get_text()
-        if not result['size_m2']:
-            size_match = re.search(r'(\d+)\s*m[²2]', body_text, re.IGNORECASE)
-            if size_match:
-                try:
-                    result['size_m2'] = int(size_match.group(1))
-                except ValueError:
-                    pass
-        if not result['bedrooms']:
-            bedrooms_match = re.search(r'(\d+)\s*quarto', body_text, re.IGNORECASE)
-            if bedrooms_match:
-                try:
-                    result['bedrooms'] = int(bedrooms_match.group(1))
-                except ValueError:
-                    pass
-        if not result['bathrooms']:
-            bathrooms_match = re.search(r'(\d+)\s*banheiro', body_text, re.IGNORECASE)
-            if bathrooms_match:
-                try:
-                    result['bathrooms'] = int(bathrooms_match.group(1))
-                except ValueError:
-                    pass
-        if not result['garage']:
-            garage_patterns = [r'(\d+)\s*vaga', r'(\d+)\s*garagem', r'garagem[:\s]*(\d+)']
-            for pattern in garage_patterns:
-                garage_match = re.search(pattern, body_text, re.IGNORECASE)
-                if garage_match:
-                    try:
-                        result['garage'] = int(garage_match.group(1))
-                        break
-                    except ValueError:
-                        pass
+        # Vagas também são cobertas por _RE_FEATURES no texto da página: ler element.text
+        # de cada <li> pelo WebDriver só repetia essa busca com uma chamada por elemento
+        for text, limit in _iter_text_windows(page.soup):
+            if _fill_features(text, result, limit):
+                break
     except Exception as e:
         logger.warning(f"Erro ao extrair características: {e}")
-    logger.debug(f"Características extraídas: {result}")
+    logger.debug(f"Características extraídas: { {field: result[field] for field in _CHARACTERISTIC_FIELDS} }")
     return result
 
 
-def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True) -> Dict[str, Optional[str]]:
-    """Extrai informações de localização."""
+def _merge_ai_location(location: Dict[str, Optional[str]], ai_location: Dict[str, Optional[str]]):
+    """Completa location com os dados da IA, sem sobrescrever o que a página já forneceu."""
+    # Atualiza apenas se IA encontrou dados melhores
+    if ai_location.get('city') and len(ai_location.get('city', '')) > len(location.get('city') or ''):
+        location['city'] = ai_location.get('city')
+    if ai_location.get('neighborhood') and not location.get('neighborhood'):
+        location['neighborhood'] = ai_location.get('neighborhood')
+    if ai_location.get('street') and not location.get('street'):
+        location['street'] = ai_location.get('street')
+    if ai_location.get('number') and not location.get('number'):
+        location['number'] = ai_location.get('number')
+    if ai_location.get('zipcode') and not location.get('zipcode'):
+        location['zipcode'] = ai_location.get('zipcode')
+    if ai_location.get('map_link') and 'google.com/maps' in ai_location.get('map_link', ''):
+        location['map_link'] = ai_location.get('map_link')
+        logger.info(f"IA encontrou link do Google Maps: {location['map_link']}")
+
+
+def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True,
+                     ai_extractor: Optional["PageAIExtractor"] = None,
+                     page: Optional[ParsedPage] = None) -> Dict[str, Optional[str]]:
+    """
+    Extrai informações de localização.
+    Se ai_extractor for informado, o fallback de IA é agendado nele e preenche o dicionário retornado
+    quando a chamada for feita (junto com a de imagens ou em PageAIExtractor.resolve()).
+    """
     location = {'city': None, 'neighborhood': None, 'street': None, 'number': None, 'zipcode': None, 'complement': None, 'map_link': None}
     try:
-        soup = BeautifulSoup(page_source, 'lxml')
-        title = soup.find('title')
-        if title:
-            title_text = title.get_text()
+        page = page or ParsedPage(page_source)
+        title_text = page.title_text
+        if title_text is not None:
             # Melhor extração da cidade - pega tudo após "em" até o final ou vírgula
             # Melhor regex para cidade - tenta pegar nome completo
-            city_patterns = [
-                r'em\s+([A-ZÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ][a-záàâãéèêíìîóòôõúùûç\s]+?)(?:,|\s*-\s*|$)',  # Cidade com capital inicial
-                r'em\s+([^,]+?)(?:,|$)',  # Fallback
-            ]
-            for pattern in city_patterns:
-                city_match = re.search(pattern, title_text, re.IGNORECASE)
+            for pattern in (_RE_CITY_STRICT, _RE_CITY_FALLBACK):
+                city_match = pattern.search(title_text)
                 if city_match:
                     city = city_match.group(1).strip()
                     # Remove vírgulas e pontos no final
-                    city = re.sub(r'[,\.\s-]+$', '', city).strip()
+                    city = city.rstrip(_TRAIL_PUNCT)
                     # Se for muito curto (menos de 3 caracteres), tenta pegar mais
                     if len(city) >= 3:  # Aceita apenas cidades com pelo menos 3 caracteres
                         location['city'] = city
                         break
-            address_match = re.search(r'na\s+([^,]+?),\s*(\d+),\s*([^,]+?)\s+em', title_text, re.IGNORECASE)
+            address_match = _RE_ADDRESS.search(title_text)
             if address_match:
                 location['street'] = address_match.group(1).strip()
                 location['number'] = address_match.group(2).strip()
@@ -231,12 +349,12 @@ def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True) -
             try:
                 # Procura em breadcrumbs ou elementos de localização
                 location_elements = driver.find_elements(By.CSS_SELECTOR, 
-                    "[class*='location'], [class*='Location'], [class*='city'], [class*='City']")
+                    "[class*='location' i], [class*='city' i]")
                 for element in location_elements:
                     text = element.text.strip()
-                    if text and len(text) < 50:  # Cidade geralmente é texto curto
+                    if 3 <= len(text) < 50:  # Cidade geralmente é texto curto
                         # Verifica se parece ser uma cidade (não contém números ou caracteres especiais demais)
-                        if re.match(r'^[A-Za-záàâãéèêíìîóòôõúùûç\s]+$', text):
+                        if _RE_CITY_ALPHA.match(text):
                             location['city'] = text
                             break
             except Exception:
@@ -261,43 +379,40 @@ def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True) -
                 "button[onclick*='location']",
             ]
             
-            for selector in map_selectors:
+            # Um único find_elements com todos os seletores: o navegador percorre o DOM uma vez
+            elements = driver.find_elements(By.CSS_SELECTOR, ", ".join(map_selectors))
+            for element in elements:
                 try:
-                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    for element in elements:
-                        # Tenta pegar o href
-                        map_url = element.get_attribute('href')
-                        if not map_url:
-                            # Tenta pegar data-href ou onclick
-                            map_url = element.get_attribute('data-href') or element.get_attribute('data-url')
+                    # Tenta pegar o href
+                    map_url = element.get_attribute('href')
+                    if not map_url:
+                        # Tenta pegar data-href ou onclick
+                        map_url = element.get_attribute('data-href') or element.get_attribute('data-url')
+                    
+                    if map_url:
+                        map_url_lower = map_url.lower()
+                        # EXCLUI links do mapa do site do Viva Real
+                        if 'mapa-do-site' in map_url_lower or 'sitemap' in map_url_lower:
+                            continue
                         
-                        if map_url:
-                            map_url_lower = map_url.lower()
-                            # EXCLUI links do mapa do site do Viva Real
-                            if 'mapa-do-site' in map_url_lower or 'sitemap' in map_url_lower:
-                                continue
-                            
-                            # Aceita apenas Google Maps ou links com coordenadas
-                            is_valid_map = (
-                                'google.com/maps' in map_url_lower or
-                                ('maps.google' in map_url_lower) or
-                                ('/maps/' in map_url_lower and 'google' in map_url_lower) or
-                                ('lat=' in map_url_lower and 'lng=' in map_url_lower)
-                            )
+                        # Aceita apenas Google Maps ou links com coordenadas
+                        is_valid_map = (
+                            'google.com/maps' in map_url_lower or
+                            ('maps.google' in map_url_lower) or
+                            ('/maps/' in map_url_lower and 'google' in map_url_lower) or
+                            ('lat=' in map_url_lower and 'lng=' in map_url_lower)
+                        )
+                        
+                        if is_valid_map:
+                            # Garante que seja uma URL completa
+                            if map_url.startswith('//'):
+                                map_url = 'https:' + map_url
+                            elif map_url.startswith('/'):
+                                continue  # URLs relativas não são válidas para Google Maps
                             
-                            if is_valid_map:
-                                # Garante que seja uma URL completa
-                                if map_url.startswith('//'):
-                                    map_url = 'https:' + map_url
-                                elif map_url.startswith('/'):
-                                    continue  # URLs relativas não são válidas para Google Maps
-                                
-                                location['map_link'] = map_url
-                                logger.info(f"Link do Google Maps encontrado: {map_url}")
-                                break
-                    
-                    if location['map_link']:
-                        break
+                            location['map_link'] = map_url
+                            logger.info(f"Link do Google Maps encontrado: {map_url}")
+                            break
                 except Exception:
                     continue
             
@@ -327,79 +442,35 @@ def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True) -
                 except Exception:
                     pass
             
-            # Se ainda não encontrou, tenta construir URL do Google Maps com os dados do endereço
-            if not location['map_link'] and location.get('street') and location.get('city'):
-                try:
-                    address_parts = []
-                    if location.get('street'):
-                        address_parts.append(location['street'])
-                    if location.get('number'):
-                        address_parts.append(location['number'])
-                    if location.get('neighborhood'):
-                        address_parts.append(location['neighborhood'])
-                    if location.get('city'):
-                        address_parts.append(location['city'])
-                    
-                    if address_parts:
-                        full_address = ', '.join([part for part in address_parts if part])
-                        # Cria link do Google Maps
-                        google_maps_url = f"https://www.google.com/maps/search/?api=1&query={full_address.replace(' ', '+')}"
-                        location['map_link'] = google_maps_url
-                        logger.info(f"Link do Google Maps gerado: {google_maps_url}")
-                except Exception as e:
-                    logger.debug(f"Erro ao gerar link do Google Maps: {e}")
-                    
         except Exception as e:
             logger.warning(f"Erro ao extrair link de localização: {e}")
         
-        # Se não encontrou localização completa e AI está habilitada, tenta usar IA
-        if (not location.get('city') or location.get('city') == 'São' or 
-            not location.get('map_link') or 'mapa-do-site' in location.get('map_link', '')) and use_ai:
-            try:
-                from src.ai_helper import extract_location_with_ai
-                logger.info("Tentando usar IA para melhorar localização...")
-                current_url = driver.current_url
-                html_snippet = page_source[:15000]
-                ai_location = extract_location_with_ai(html_snippet, current_url)
-                
-                # Atualiza apenas se IA encontrou dados melhores
-                if ai_location.get('city') and len(ai_location.get('city', '')) > len(location.get('city', '')):
-                    location['city'] = ai_location.get('city')
-                if ai_location.get('neighborhood') and not location.get('neighborhood'):
-                    location['neighborhood'] = ai_location.get('neighborhood')
-                if ai_location.get('street') and not location.get('street'):
-                    location['street'] = ai_location.get('street')
-                if ai_location.get('number') and not location.get('number'):
-                    location['number'] = ai_location.get('number')
-                if ai_location.get('zipcode') and not location.get('zipcode'):
-                    location['zipcode'] = ai_location.get('zipcode')
-                if ai_location.get('map_link') and 'google.com/maps' in ai_location.get('map_link', ''):
-                    location['map_link'] = ai_location.get('map_link')
-                    logger.info(f"IA encontrou link do Google Maps: {location['map_link']}")
-                
-            except Exception as e:
-                logger.debug(f"Erro ao usar IA para localização: {e}")
+        # Só recorre à IA quando a cidade está ausente ou incompleta; um map_link ausente
+        # não justifica a chamada, pois é reconstruído do endereço logo abaixo
+        city = location.get('city')
+        if use_ai and (not city or city == 'São' or len(city) < 4):
+            if ai_extractor is not None:
+                # A consulta fica agendada: se extract_images também precisar da IA, as duas partes
+                # saem numa só chamada; senão, PageAIExtractor.resolve() faz a chamada só de localização
+                page_link = location['map_link']
+                def apply_ai_location(ai_location: Dict[str, Optional[str]]):
+                    location['map_link'] = page_link
+                    _merge_ai_location(location, ai_location)
+                    if not location['map_link']:
+                        location['map_link'] = _build_map_link(location)
+                ai_extractor.defer_location(apply_ai_location)
+            else:
+                try:
+                    logger.info("Tentando usar IA para melhorar localização...")
+                    from src.ai_helper import extract_location_with_ai
+                    current_url = driver.current_url
+                    _merge_ai_location(location, extract_location_with_ai(page_source, current_url))
+                except Exception as e:
+                    logger.debug(f"Erro ao usar IA para localização: {e}")
         
-        # Se ainda não tem map_link válido, tenta construir do endereço
-        if not location.get('map_link') or 'mapa-do-site' in location.get('map_link', ''):
-            try:
-                address_parts = []
-                if location.get('street'):
-                    address_parts.append(location['street'])
-                if location.get('number'):
-                    address_parts.append(location['number'])
-                if location.get('neighborhood'):
-                    address_parts.append(location['neighborhood'])
-                if location.get('city') and location['city'] != 'São':  # Evita usar cidade incompleta
-                    address_parts.append(location['city'])
-                
-                if len(address_parts) >= 2:  # Precisa de pelo menos 2 partes
-                    full_address = ', '.join([part for part in address_parts if part])
-                    google_maps_url = f"https://www.google.com/maps/search/?api=1&query={full_address.replace(' ', '+')}"
-                    location['map_link'] = google_maps_url
-                    logger.info(f"Google Maps gerado do endereço: {google_maps_url}")
-            except Exception as e:
-                logger.debug(f"Erro ao gerar link do Google Maps: {e}")
+        # Se não encontrou link na página (nem pela IA), constrói do endereço
+        if not location['map_link']:
+            location['map_link'] = _build_map_link(location)
                 
     except Exception as e:
         logger.warning(f"Erro ao extrair localização: {e}")
@@ -409,26 +480,24 @@ def extract_location(driver: WebDriver, page_source: str, use_ai: bool = True) -
 def extract_description(driver: WebDriver, page_source: str) -> Optional[str]:
     """Extrai a descrição completa do imóvel."""
     try:
-        soup = BeautifulSoup(page_source, 'lxml')
         description_selectors = [
             "[class*='description']",
             "[class*='Description']",
             "[data-testid*='description']",
         ]
-        for selector in description_selectors:
+        elements = driver.find_elements(By.CSS_SELECTOR, ", ".join(description_selectors))
+        for element in elements:
             try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for element in elements:
-                    text = element.text.strip()
-                    if len(text) > 50:
-                        lines = text.split('\n')
-                        description_lines = []
-                        for line in lines:
-                            line = line.strip()
-                            if line and not any(header in line.lower() for header in ['descrição', 'características']):
-                                description_lines.append(line)
-                        if description_lines:
-                            return '\n'.join(description_lines)
+                text = element.text.strip()
+                if len(text) > 50:
+                    lines = text.split('\n')
+                    description_lines = []
+                    for line in lines:
+                        line = line.strip()
+                        if line and not _RE_DESCRIPTION_HEADER.search(line):
+                            description_lines.append(line)
+                    if description_lines:
+                        return '\n'.join(description_lines)
             except Exception:
                 continue
     except Exception as e:
@@ -436,42 +505,47 @@ def extract_description(driver: WebDriver, page_source: str) -> Optional[str]:
     return None
 
 
-def extract_codes(driver: WebDriver, page_source: str) -> Dict[str, Optional[str]]:
+def extract_codes(driver: WebDriver, page_source: str, page: Optional[ParsedPage] = None) -> Dict[str, Optional[str]]:
     """Extrai códigos do anunciante e do Viva Real."""
     codes = {'advertiser_code': None, 'vivareal_code': None}
     try:
-        soup = BeautifulSoup(page_source, 'lxml')
-        body_text = soup.get_text()
+        page = page or ParsedPage(page_source)
         
-        # Procura por padrões de código
-        # Código do anunciante: MF1203, etc
-        advertiser_match = re.search(r'Código\s+do\s+anunciante[:\s]*([A-Z0-9]+)', body_text, re.IGNORECASE)
-        if advertiser_match:
-            codes['advertiser_code'] = advertiser_match.group(1).strip()
-        
-        # Código Viva Real: pode estar no formato "Código no Viva Real: 2856559150" ou "-id-2856559150"
-        vivareal_match = re.search(r'Código\s+(?:no\s+)?Viva\s+Real[:\s]*(\d+)', body_text, re.IGNORECASE)
-        if vivareal_match:
-            codes['vivareal_code'] = vivareal_match.group(1).strip()
+        # Procura por padrões de código no texto da página, parando assim que ambos forem encontrados
+        for text, limit in _iter_text_windows(page.soup):
+            # Código do anunciante: MF1203, etc
+            if not codes['advertiser_code']:
+                advertiser_match = _RE_ADV_CODE.search(text)
+                if advertiser_match and advertiser_match.end() <= limit:
+                    codes['advertiser_code'] = advertiser_match.group(1).strip()
+            
+            # Código Viva Real: pode estar no formato "Código no Viva Real: 2856559150" ou "-id-2856559150"
+            if not codes['vivareal_code']:
+                vivareal_match = _RE_VR_CODE.search(text)
+                if vivareal_match and vivareal_match.end() <= limit:
+                    codes['vivareal_code'] = vivareal_match.group(1).strip()
+            
+            if codes['advertiser_code'] and codes['vivareal_code']:
+                break
         
         # Se não encontrou, tenta extrair da URL
         if not codes['vivareal_code']:
             current_url = driver.current_url
-            id_match = re.search(r'-id-(\d+)', current_url)
+            id_match = _RE_ID_URL.search(current_url)
             if id_match:
                 codes['vivareal_code'] = id_match.group(1)
         
         # Tenta encontrar nos elementos da página
         try:
-            code_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Código')]")
-            for element in code_elements:
-                text = element.text
+            # Textos de todos os elementos em uma única chamada, em vez de um element.text por elemento
+            code_texts = driver.execute_script(_JS_XPATH_TEXTS, "//*[contains(text(), 'Código')]") or []
+            for text in code_texts:
                 if 'anunciante' in text.lower():
-                    match = re.search(r'Código\s+do\s+anunciante[:\s]*([A-Z0-9]+)', text, re.IGNORECASE)
+                    match = _RE_ADV_CODE.search(text)
                     if match and not codes['advertiser_code']:
                         codes['advertiser_code'] = match.group(1).strip()
                 if 'viva real' in text.lower():
-                    match = re.search(r'Código\s+(?:no\s+)?Viva\s+Real[:\s]*(\d+)', text, re.IGNORECASE)
+                    match = _RE_VR_CODE.search(text)
                     if match and not codes['vivareal_code']:
                         codes['vivareal_code'] = match.group(1).strip()
         except Exception:
@@ -521,7 +595,11 @@ def extract_images_with_network_interception(driver: WebDriver, max_images: int
         
         for log in logs:
             try:
-                message = json.loads(log['message'])
+                raw_message = log['message']
+                # Descarta sem decodificar o JSON os eventos que não são respostas de imagem
+                if '"Network.responseReceived"' not in raw_message or '"image/' not in raw_message:
+                    continue
+                message = orjson.loads(raw_message)
                 method = message.get('message', {}).get('method', '')
                 
                 # Intercepta respostas de rede
@@ -531,23 +609,18 @@ def extract_images_with_network_interception(driver: WebDriver, max_images: int
                     mime_type = response.get('mimeType', '')
                     
                     # Verifica se é uma imagem
-                    if mime_type.startswith('image/'):
+                    # Cada URL é classificada uma única vez, mesmo que reapareça em várias respostas
+                    if mime_type.startswith('image/') and url not in seen_urls:
+                        seen_urls.add(url)
                         url_lower = url.lower()
                         
-                        # Filtra apenas imagens do Viva Real relacionadas ao imóvel
-                        if any(domain in url_lower for domain in ['resizedimgs.vivareal.com', 'vivareal.com.br/img']):
-                            # Exclui logos, banners, etc
-                            exclude_keywords = ['logo', 'banner', 'icon', 'avatar', 'profile', 'corretor', 'agent', 
-                                              'mota-fonseca', 'thumbnail', 'placeholder']
-                            if not any(keyword in url_lower for keyword in exclude_keywords):
-                                # Verifica se parece ser imagem do imóvel
-                                if 'vr-listing' in url_lower or '/img/vr-listing/' in url_lower:
-                                    if url not in seen_urls:
-                                        images.append(url)
-                                        seen_urls.add(url)
-                                        if len(images) >= max_images:
-                                            break
-            except (KeyError, json.JSONDecodeError, ValueError):
+                        # Apenas imagens do Viva Real relacionadas ao imóvel, sem logos, banners, etc
+                        if (_RE_IMG_DOMAIN.search(url_lower) and not _RE_IMG_EXCLUDE.search(url_lower)
+                                and _RE_IMG_LISTING.search(url_lower)):
+                            images.append(url)
+                            if len(images) >= max_images:
+                                break
+            except (KeyError, orjson.JSONDecodeError, ValueError):
                 continue
         
         logger.info(f"Interceptação de rede encontrou {len(images)} imagens")
@@ -563,8 +636,7 @@ def extract_images_with_page_interaction(driver: WebDriver, max_images: int = 15
     Estratégia 2: Interage com a página para carregar imagens dinamicamente.
     Rola a página, clica em botões, aguarda lazy loading.
     """
-    images = []
-    seen_urls = set()
+    images: Dict[str, None] = {}  # Lista ordenada e conjunto de vistas em uma só estrutura
     
     try:
         # Rola gradualmente para disparar lazy loading
@@ -589,19 +661,13 @@ def extract_images_with_page_interaction(driver: WebDriver, max_images: int = 15
                 "button[aria-label*='mais fotos' i]",
                 "button[aria-label*='ver mais' i]",
                 "a[aria-label*='mais fotos' i]",
-                "button:contains('Ver mais fotos')",
                 "[class*='more-photos']",
                 "[class*='ver-mais']",
             ]
-            for selector in more_photos_selectors:
-                try:
-                    elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                    if elements:
-                        elements[0].click()
-                        time.sleep(3)
-                        break
-                except:
-                    continue
+            elements = driver.find_elements(By.CSS_SELECTOR, ", ".join(more_photos_selectors))
+            if elements:
+                elements[0].click()
+                time.sleep(3)
         except:
             pass
         
@@ -617,149 +683,120 @@ def extract_images_with_page_interaction(driver: WebDriver, max_images: int = 15
             "[class*='photo'] img",
         ]
         
-        for selector in image_selectors:
-            try:
-                elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                for element in elements:
-                    if len(images) >= max_images:
-                        break
-                    
-                    # Pega URL da imagem
-                    img_url = (element.get_attribute('src') or 
-                              element.get_attribute('data-src') or
-                              element.get_attribute('data-lazy-src'))
-                    
-                    if img_url and img_url not in seen_urls:
-                        img_url_lower = img_url.lower()
-                        # Filtra apenas imagens do imóvel
-                        if 'vr-listing' in img_url_lower or '/img/vr-listing/' in img_url_lower:
-                            exclude_keywords = ['logo', 'banner', 'icon', 'avatar', 'profile']
-                            if not any(keyword in img_url_lower for keyword in exclude_keywords):
-                                images.append(img_url)
-                                seen_urls.add(img_url)
-                                
-            except Exception:
-                continue
+        # Lê src/data-src de todas as imagens em uma única chamada, em vez de até 3 por elemento
+        img_urls = driver.execute_script(_JS_IMAGE_URLS, ", ".join(image_selectors)) or []
+        for img_url in img_urls:
+            if len(images) >= max_images:
+                break
+            # Filtra apenas imagens do imóvel
+            if img_url not in images and _RE_IMG_LISTING.search(img_url) and not _RE_IMG_REJECT.search(img_url):
+                images[img_url] = None
         
         logger.info(f"Interação com página encontrou {len(images)} imagens")
         
     except Exception as e:
         logger.warning(f"Erro na interação com página: {e}")
     
-    return images[:max_images]
+    return list(images)[:max_images]
 
 
-def extract_images_from_scripts(page_source: str, max_images: int = 15) -> List[str]:
+def extract_images_from_scripts(page_source: str, max_images: int = 15, page: Optional[ParsedPage] = None) -> List[str]:
     """
     Estratégia 3: Busca URLs de imagens em scripts JavaScript e JSON-LD.
     """
-    images = []
-    seen_urls = set()
+    images: Dict[str, None] = {}  # Lista ordenada e conjunto de vistas em uma só estrutura
     
+    # Busca em scripts JSON-LD (uma falha aqui não impede a varredura dos scripts inline abaixo)
     try:
-        soup = BeautifulSoup(page_source, 'lxml')
-        
-        # Busca em scripts JSON-LD
-        json_ld_scripts = soup.find_all('script', type='application/ld+json')
-        for script in json_ld_scripts:
+        page = page or ParsedPage(page_source)
+        for script_text in page.json_ld_texts:
             try:
-                data = json.loads(script.string)
-                # Busca recursivamente por URLs de imagens
-                def find_images_in_dict(obj, depth=0):
-                    if depth > 10:  # Limita profundidade
-                        return
-                    if isinstance(obj, dict):
-                        for key, value in obj.items():
-                            if 'image' in key.lower() and isinstance(value, str):
-                                if 'vivareal.com' in value.lower() and 'vr-listing' in value.lower():
-                                    if value not in seen_urls:
-                                        images.append(value)
-                                        seen_urls.add(value)
-                            else:
-                                find_images_in_dict(value, depth + 1)
+                data = json.loads(script_text)
+                # Percorre o JSON com uma pilha (na mesma ordem da busca em profundidade),
+                # parando assim que o limite de imagens é atingido
+                stack = [(data, 0, False)]
+                while stack and len(images) < max_images:
+                    obj, depth, is_image_key = stack.pop()
+                    if is_image_key:
+                        value_lower = obj.lower()
+                        if 'vivareal.com' in value_lower and 'vr-listing' in value_lower:
+                            images[obj] = None
+                    elif depth > 10:  # Limita profundidade
+                        continue
+                    elif isinstance(obj, dict):
+                        stack.extend(
+                            (value, depth + 1, isinstance(value, str) and 'image' in key.lower())
+                            for key, value in reversed(obj.items())
+                        )
                     elif isinstance(obj, list):
-                        for item in obj:
-                            find_images_in_dict(item, depth + 1)
-                
-                find_images_in_dict(data)
+                        stack.extend((item, depth + 1, False) for item in reversed(obj))
             except (json.JSONDecodeError, AttributeError):
                 continue
-        
-        # Busca em scripts inline que podem conter dados de imagens
-        all_scripts = soup.find_all('script')
-        image_url_pattern = r'https?://[^"\'\s]*resizedimgs\.vivareal\.com[^"\'\s]*vr-listing[^"\'\s]*\.(?:jpg|jpeg|png|webp)'
-        
-        for script in all_scripts:
-            if script.string:
-                matches = re.findall(image_url_pattern, script.string, re.IGNORECASE)
-                for match in matches:
-                    # Remove parâmetros de query se houver
-                    clean_url = match.split('?')[0] if '?' in match else match
-                    if clean_url not in seen_urls:
-                        images.append(clean_url)
-                        seen_urls.add(clean_url)
-                        if len(images) >= max_images:
-                            break
+    except Exception as e:
+        logger.warning(f"Erro ao ler scripts JSON-LD: {e}")
+    
+    try:
+        # Busca as URLs dos scripts inline com um único regex sobre o HTML bruto, em vez de
+        # percorrer cada <script>; a checagem de substring evita a varredura quando não há fotos
+        if len(images) < max_images and 'resizedimgs.vivareal.com' in page_source:
+            for match in _RE_SCRIPT_IMAGE_URL.finditer(page_source):
+                # Remove parâmetros de query se houver
+                clean_url = match.group(0).partition('?')[0]
+                images[clean_url] = None
+                if len(images) >= max_images:
+                    break
         
         logger.info(f"Busca em scripts encontrou {len(images)} imagens")
         
     except Exception as e:
         logger.warning(f"Erro ao buscar imagens em scripts: {e}")
     
-    return images[:max_images]
+    return list(images)[:max_images]
 
 
-def extract_images(driver: WebDriver, page_source: str, max_images: int = 15, use_ai: bool = True) -> List[str]:
+def extract_images(driver: WebDriver, page_source: str, max_images: int = 15, use_ai: bool = True,
+                   ai_extractor: Optional["PageAIExtractor"] = None,
+                   page: Optional[ParsedPage] = None) -> List[str]:
     """
     Extrai URLs das imagens do imóvel usando múltiplas estratégias em sequência.
     Filtra apenas fotos reais do imóvel, excluindo logos, banners, avatares, etc.
+    Se ai_extractor for informado, o fallback de IA inclui na mesma chamada a localização agendada por extract_location.
     """
-    images = []
-    seen_urls = set()
+    # dict preserva a ordem de inserção: cada estratégia acrescenta só as URLs ainda não vistas
+    images: Dict[str, None] = {}
     
     # Estratégia 1: Interceptação de rede (mais confiável)
     logger.info("Tentando extrair imagens via interceptação de rede...")
-    network_images = extract_images_with_network_interception(driver, max_images)
-    for img in network_images:
-        if img not in seen_urls:
-            images.append(img)
-            seen_urls.add(img)
+    images.update(dict.fromkeys(extract_images_with_network_interception(driver, max_images)))
     
     # Estratégia 2: Se não encontrou suficiente, interage com página
     if len(images) < 3:
         logger.info("Poucas imagens encontradas, tentando interação com página...")
-        interaction_images = extract_images_with_page_interaction(driver, max_images)
-        for img in interaction_images:
-            if img not in seen_urls:
-                images.append(img)
-                seen_urls.add(img)
+        images.update(dict.fromkeys(extract_images_with_page_interaction(driver, max_images)))
     
     # Estratégia 3: Se ainda não encontrou suficiente, busca em scripts
     if len(images) < 3:
         logger.info("Poucas imagens encontradas, buscando em scripts JavaScript/JSON...")
-        script_images = extract_images_from_scripts(page_source, max_images)
-        for img in script_images:
-            if img not in seen_urls:
-                images.append(img)
-                seen_urls.add(img)
+        images.update(dict.fromkeys(extract_images_from_scripts(page_source, max_images, page=page)))
     
     # Estratégia 4: Se ainda vazio, usa IA como último recurso
     if len(images) < 1 and use_ai:
         try:
             logger.info("Tentando usar IA para encontrar imagens...")
-            from src.ai_helper import extract_images_with_ai
-            current_url = driver.current_url
-            html_snippet = page_source[:30000]  # Limita tamanho para economizar tokens
-            ai_images = extract_images_with_ai(html_snippet, current_url)
-            for ai_img in ai_images:
-                if ai_img not in seen_urls and len(images) < max_images:
-                    images.append(ai_img)
-                    seen_urls.add(ai_img)
+            if ai_extractor is not None:
+                ai_images = ai_extractor.images()
+            else:
+                from src.ai_helper import extract_images_with_ai
+                current_url = driver.current_url
+                html_snippet = page_source[:30000]  # Limita tamanho para economizar tokens
+                ai_images = extract_images_with_ai(html_snippet, current_url)
+            images.update(dict.fromkeys(ai_images))
             if ai_images:
                 logger.info(f"IA encontrou {len(ai_images)} imagens adicionais")
         except Exception as e:
             logger.debug(f"Erro ao usar IA para imagens: {e}")
     
-    logger.info(f"Total de {len(images)} imagens válidas extraídas")
-    return images[:max_images]
+    result = list(images)[:max_images]
+    logger.info(f"Total de {len(result)} imagens válidas extraídas")
+    return result
 
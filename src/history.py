@@ -0,0 +1,62 @@
+"""Armazenamento em disco do histórico de imóveis extraídos."""
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Union
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Prefixo dos arquivos de histórico (um por sessão do Streamlit)
+HISTORY_FILE_PREFIX = 'history_'
+
+
+class HistoryStore:
+    """
+    Histórico de imóveis gravado em um arquivo NDJSON append-only (um registro por linha).
+    A sessão guarda apenas um índice leve (url, property_id, filepath, timestamp);
+    os dados completos ficam em disco e são exportados de uma vez pelo download.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def append(self, data: Dict):
+        """Grava o registro no fim do arquivo."""
+        line = orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+        with open(self.path, 'ab', buffering=1 << 20) as f:
+            f.write(line)
+
+    def read_bytes(self) -> bytes:
+        """Retorna o arquivo inteiro, pronto para download como NDJSON."""
+        if not self.path.exists():
+            return b''
+        return self.path.read_bytes()
+
+    def clear(self):
+        """Remove o arquivo de histórico."""
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Erro ao remover histórico {self.path}: {e}")
+
+
+def purge_stale_histories(directory: Union[str, Path], max_age_hours: float = 24) -> int:
+    """
+    Remove os históricos de sessões abandonadas: arquivos history_*.ndjson do diretório
+    sem escrita há mais de max_age_hours. Retorna quantos arquivos foram removidos.
+    """
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for path in Path(directory).glob(f"{HISTORY_FILE_PREFIX}*.ndjson"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError as e:
+            logger.warning(f"Erro ao remover histórico antigo {path}: {e}")
+    if removed:
+        logger.info(f"{removed} histórico(s) de sessões antigas removido(s)")
+    return removed
@@ -1,11 +1,15 @@
 """Classe principal do scraper do Viva Real."""
 import json
 import logging
+import queue
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 from functools import wraps
+from urllib.parse import urlsplit
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -18,14 +22,21 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 from src.extractors import (
     extract_property_type, extract_modality, extract_price,
-    extract_characteristics, extract_location, extract_description, extract_images, extract_codes
+    extract_characteristics_into, extract_location, extract_description, extract_images, extract_codes,
+    ParsedPage
 )
 from src.validators import clean_data
-from src.utils import get_headers, rate_limit
+from src.ai_helper import PageAIExtractor
+from src.utils import HostThrottle, get_random_user_agent, rate_limit
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Sinal de que o conteúdo dinâmico do anúncio já está na página
+_JS_LISTING_READY = (
+    "return document.querySelectorAll('img[src*=\"vr-listing\"]').length >= 1 || !!window.__NEXT_DATA__;"
+)
+
 
 def retry_on_failure(max_retries: int = 3, delay: float = 2.0):
     """Decorator para retry logic."""
@@ -54,6 +65,8 @@ class VivaRealScraper:
         self.timeout = timeout
         self.driver = None
         self.headless = headless
+        # Thread dedicada ao parse do HTML, que se sobrepõe às esperas do WebDriver durante a extração
+        self._parse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='vivareal-parse')
         self._setup_driver()
 
     def _setup_driver(self):
@@ -66,8 +79,7 @@ class VivaRealScraper:
         chrome_options.add_argument('--disable-blink-features=AutomationControlled')
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
-        headers = get_headers()
-        chrome_options.add_argument(f'user-agent={headers["User-Agent"]}')
+        chrome_options.add_argument(f'user-agent={get_random_user_agent()}')
         try:
             service = Service(ChromeDriverManager().install())
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
@@ -127,8 +139,13 @@ class VivaRealScraper:
             if not element_found:
                 logger.warning("Elementos-chave não encontrados, mas continuando...")
             
-            # Aguarda um pouco mais para garantir que conteúdo dinâmico carregou
-            time.sleep(3)
+            # Em vez de uma espera fixa, aguarda um sinal concreto de que o conteúdo dinâmico carregou:
+            # fotos do anúncio no DOM ou os dados da página hidratados
+            try:
+                WebDriverWait(self.driver, 5).until(lambda d: d.execute_script(_JS_LISTING_READY))
+            except TimeoutException:
+                logger.debug("Conteúdo dinâmico não sinalizou carregamento, continuando...")
+                time.sleep(0.5)
             
         except TimeoutException:
             logger.warning("Timeout ao aguardar carregamento da página")
@@ -136,32 +153,29 @@ class VivaRealScraper:
     def _clean_driver_state(self):
         """Limpa o estado do WebDriver antes de processar uma nova URL."""
         try:
-            # Limpa cookies
-            self.driver.delete_all_cookies()
-            logger.debug("Cookies limpos")
+            # Limpa cookies de todos os domínios com um único comando CDP
+            try:
+                self.driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                logger.debug("Cookies limpos")
+            except Exception as e:
+                logger.debug(f"Erro ao limpar cookies via CDP: {e}")
+                self.driver.delete_all_cookies()
             
-            # Limpa localStorage e sessionStorage via JavaScript
+            # Limpa localStorage e sessionStorage em uma única chamada JavaScript
             try:
-                self.driver.execute_script("window.localStorage.clear();")
-                self.driver.execute_script("window.sessionStorage.clear();")
+                self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
                 logger.debug("localStorage e sessionStorage limpos")
             except Exception as e:
                 logger.debug(f"Erro ao limpar storage: {e}")
             
-            # Limpa cache (desabilita e reabilita cache)
+            # Limpa cache
             try:
                 self.driver.execute_cdp_cmd('Network.clearBrowserCache', {})
                 logger.debug("Cache do navegador limpo")
             except Exception as e:
                 logger.debug(f"Erro ao limpar cache: {e}")
             
-            # Limpa logs de performance (desabilita e reabilita)
-            try:
-                self.driver.execute_cdp_cmd('Performance.disable', {})
-                self.driver.execute_cdp_cmd('Network.disable', {})
-                logger.debug("Logs de performance resetados")
-            except Exception as e:
-                logger.debug(f"Erro ao resetar logs: {e}")
+            # Performance/Network não são desabilitados aqui: _wait_for_page_load os reabilita a cada página
                 
         except Exception as e:
             logger.warning(f"Erro ao limpar estado do driver: {e}")
@@ -184,8 +198,8 @@ class VivaRealScraper:
             time.sleep(1)  # Aguarda navegação completar
             current_url = self.driver.current_url
             # Normaliza URLs para comparação (remove parâmetros de query, etc)
-            url_normalized = url.split('?')[0].strip('/')
-            current_normalized = current_url.split('?')[0].strip('/')
+            url_normalized = url.partition('?')[0].strip('/')
+            current_normalized = current_url.partition('?')[0].strip('/')
             
             if url_normalized not in current_normalized and current_normalized not in url_normalized:
                 logger.warning(f"URL navegada ({current_url}) não corresponde exatamente à URL solicitada ({url})")
@@ -194,7 +208,7 @@ class VivaRealScraper:
                 self.driver.get(url)
                 time.sleep(1)
                 current_url = self.driver.current_url
-                current_normalized = current_url.split('?')[0].strip('/')
+                current_normalized = current_url.partition('?')[0].strip('/')
                 if url_normalized not in current_normalized and current_normalized not in url_normalized:
                     logger.error(f"Não foi possível navegar para {url}. URL atual: {current_url}")
                     # Continua mesmo assim, pode ser redirecionamento válido
@@ -203,29 +217,34 @@ class VivaRealScraper:
             else:
                 logger.debug(f"Navegação confirmada para: {current_url}")
             
-            rate_limit(1, 2)
+            rate_limit(1, 2, host=urlsplit(url).netloc.lower())
             self._wait_for_page_load()
             page_source = self.driver.page_source
             if not page_source or len(page_source) < 1000:
                 raise ValueError("Página não carregou completamente")
             logger.info(f"Iniciando extração de dados para {url}")
+            # Os fallbacks de IA de localização e imagens compartilham uma única chamada quando os dois são necessários
+            # O HTML é parseado uma única vez e compartilhado entre todos os extratores
+            page = ParsedPage(page_source, self.driver.current_url, executor=self._parse_executor)
+            ai_extractor = PageAIExtractor(page_source, page.url, page=page)
             data = {
                 'url': url,
-                'scraped_at': datetime.utcnow().isoformat() + 'Z',
-                'property_type': extract_property_type(self.driver, page_source),
+                'scraped_at': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'property_type': extract_property_type(self.driver, page_source, page=page),
                 'category': None,
-                'modality': extract_modality(self.driver, page_source),
-                'price': extract_price(self.driver, page_source),
+                'modality': extract_modality(self.driver, page_source, page=page),
+                'price': extract_price(self.driver, page_source, page=page),
                 'size_m2': None, 'bedrooms': None, 'suites': None,
                 'bathrooms': None, 'garage': None,
-                'location': extract_location(self.driver, page_source, use_ai=True),
+                'location': extract_location(self.driver, page_source, use_ai=True, ai_extractor=ai_extractor, page=page),
                 'description': extract_description(self.driver, page_source),
-                'images': extract_images(self.driver, page_source, use_ai=True),
+                'images': extract_images(self.driver, page_source, use_ai=True, ai_extractor=ai_extractor, page=page),
             }
+            # Fallback de localização que não saiu junto com o de imagens
+            ai_extractor.resolve()
             logger.info(f"Extraction inicial concluída: property_type={data.get('property_type') is not None}, price={data.get('price') is not None}, images={len(data.get('images', []))}")
-            characteristics = extract_characteristics(self.driver, page_source)
-            data.update(characteristics)
-            codes = extract_codes(self.driver, page_source)
+            extract_characteristics_into(self.driver, page_source, data, page=page)
+            codes = extract_codes(self.driver, page_source, page=page)
             data['advertiser_code'] = codes.get('advertiser_code')
             data['vivareal_code'] = codes.get('vivareal_code')
             
@@ -240,14 +259,20 @@ class VivaRealScraper:
                 logger.warning(f"Nenhum campo essencial foi extraído para {url}, tentando reextrair...")
                 # Tenta aguardar mais um pouco e reextrair
                 time.sleep(5)
-                page_source = self.driver.page_source
+                # Só refaz o parse (e a chamada à IA) se o DOM mudou durante a espera
+                new_page_source = self.driver.page_source
+                if new_page_source != page_source:
+                    page_source = new_page_source
+                    page = ParsedPage(page_source, self.driver.current_url, executor=self._parse_executor)
+                    ai_extractor = PageAIExtractor(page_source, page.url, page=page)
                 # Re-extrai campos essenciais
                 if not data.get('property_type'):
-                    data['property_type'] = extract_property_type(self.driver, page_source)
+                    data['property_type'] = extract_property_type(self.driver, page_source, page=page)
                 if not data.get('price'):
-                    data['price'] = extract_price(self.driver, page_source)
+                    data['price'] = extract_price(self.driver, page_source, page=page)
                 if not data.get('location') or not data.get('location', {}).get('city'):
-                    data['location'] = extract_location(self.driver, page_source, use_ai=True)
+                    data['location'] = extract_location(self.driver, page_source, use_ai=True, ai_extractor=ai_extractor, page=page)
+                    ai_extractor.resolve()
                 
                 # Loga resultado da re-extração
                 re_extracted = sum(1 for field in essential_fields if (
@@ -268,6 +293,7 @@ class VivaRealScraper:
 
     def close(self):
         """Fecha o navegador."""
+        self._parse_executor.shutdown(wait=False, cancel_futures=True)
         if self.driver:
             self.driver.quit()
 
@@ -277,3 +303,39 @@ class VivaRealScraper:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+
+def scrape_many(urls: Iterable[str], concurrency: int = 4, headless: bool = True, timeout: int = 45,
+                throttle: Optional[HostThrottle] = None,
+                process: Optional[Callable[[str, VivaRealScraper], Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Processa várias URLs em paralelo com um pool de navegadores já inicializados
+    (o custo de abrir o Chrome é pago uma vez por worker) e gera (url, resultado) na ordem de conclusão.
+    process(url, scraper) produz o resultado de cada URL (padrão: scraper.scrape(url));
+    exceções lançadas por ele são propagadas. Se throttle for informado, é respeitado antes de cada URL.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+    if process is None:
+        process = lambda url, scraper: scraper.scrape(url)
+    num_workers = max(1, min(concurrency, len(urls)))
+    
+    with ExitStack() as stack:
+        scraper_pool = queue.Queue()
+        for _ in range(num_workers):
+            scraper_pool.put(stack.enter_context(VivaRealScraper(headless=headless, timeout=timeout)))
+        
+        def run(url: str):
+            # Reserva um navegador livre do pool e o devolve ao terminar
+            scraper = scraper_pool.get()
+            try:
+                if throttle is not None:
+                    throttle.wait(url)
+                return process(url, scraper)
+            finally:
+                scraper_pool.put(scraper)
+        
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            futures = {executor.submit(run, url): url for url in urls}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
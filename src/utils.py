@@ -1,7 +1,9 @@
 """Funções auxiliares para o scraper."""
 import time
 import random
-from typing import Dict
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 
 # User-Agents para rotação
 USER_AGENTS = [
@@ -17,29 +19,71 @@ def get_random_user_agent() -> str:
     return random.choice(USER_AGENTS)
 
 
+# Parte fixa dos headers, montada uma única vez; só o User-Agent varia por chamada
+_BASE_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
 def get_headers() -> Dict[str, str]:
     """Retorna headers HTTP padrão para requisições."""
-    return {
-        'User-Agent': get_random_user_agent(),
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-    }
+    return {'User-Agent': get_random_user_agent(), **_BASE_HEADERS}
+
+
+# Horário (time.monotonic) da última passagem por rate_limit para cada host
+_last_request: Dict[str, float] = {}
+_last_request_lock = threading.Lock()
 
 
-def rate_limit(min_seconds: float = 2.0, max_seconds: float = 5.0):
+def rate_limit(min_seconds: float = 2.0, max_seconds: float = 5.0, host: Optional[str] = None):
     """
     Implementa rate limiting com delay aleatório.
+    Se host for informado, desconta o tempo já decorrido desde a última chamada para o mesmo host
+    e só dorme o que faltar para completar o delay.
     
     Args:
         min_seconds: Tempo mínimo de espera em segundos
         max_seconds: Tempo máximo de espera em segundos
+        host: Host da requisição (None mantém a espera incondicional)
     """
     delay = random.uniform(min_seconds, max_seconds)
-    time.sleep(delay)
+    if host is None:
+        time.sleep(delay)
+        return
+    with _last_request_lock:
+        last = _last_request.get(host)
+    if last is not None:
+        delay -= time.monotonic() - last
+    if delay > 0:
+        time.sleep(delay)
+    with _last_request_lock:
+        _last_request[host] = time.monotonic()
 
 
+class HostThrottle:
+    """
+    Garante um intervalo mínimo entre requisições ao mesmo host.
+    Thread-safe: cada chamada reserva o próximo horário livre do host e dorme fora do lock.
+    
+    Args:
+        min_interval: Intervalo mínimo em segundos entre duas requisições ao mesmo host
+    """
 
+    def __init__(self, min_interval: float = 3.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
 
+    def wait(self, url: str):
+        """Bloqueia até que seja permitido requisitar o host da URL."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
@@ -1,13 +1,47 @@
 """Funções para validar e limpar dados extraídos."""
 import re
 import logging
-from typing import Dict, Any, Optional
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
-
-def normalize_text(text: Optional[str]) -> Optional[str]:
-    """Normaliza texto: remove espaços extras, normaliza encoding."""
+# Padrões compilados uma única vez, no import do módulo
+_RE_NON_DIGIT = re.compile(r'\D')
+_RE_PRICE_STRIP = re.compile(r'[^\d.,]')
+_RE_URL = re.compile(
+    r'^https?://'  # http:// or https://
+    r'[a-z0-9.-]+'  # host
+    r'(?::\d+)?'  # optional port
+    r'(?:[/?#]\S*)?$', re.IGNORECASE | re.ASCII)
+
+# Funções puras chamadas repetidamente com os mesmos valores ao longo de um lote
+# (URLs de imagens e mapas, tipos de imóvel, CEPs, preços): os resultados ficam em cache
+_VALIDATOR_CACHE_SIZE = 4096
+_CACHEABLE_TYPES = (str, int, float)
+
+
+def _cache_scalars(func: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """
+    Aplica lru_cache a func só para strings e números. Outros valores (listas e dicts vindos
+    da IA ou do JSON-LD, None) vão direto para func, mantendo o comportamento sem cache
+    em vez de levantar TypeError por não serem hashable.
+    """
+    cached = lru_cache(maxsize=_VALIDATOR_CACHE_SIZE, typed=True)(func)
+
+    @wraps(func)
+    def wrapper(value):
+        if isinstance(value, _CACHEABLE_TYPES):
+            return cached(value)
+        return func(value)
+
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+def _normalize_text(text: Optional[str]) -> Optional[str]:
+    """Normaliza texto sem passar pelo cache (para textos longos e únicos, como a descrição)."""
     if not text:
         return None
     if not isinstance(text, str):
@@ -19,11 +53,18 @@ def normalize_text(text: Optional[str]) -> Optional[str]:
     return text
 
 
+@_cache_scalars
+def normalize_text(text: Optional[str]) -> Optional[str]:
+    """Normaliza texto: remove espaços extras, normaliza encoding."""
+    return _normalize_text(text)
+
+
+@_cache_scalars
 def normalize_zipcode(zipcode: Optional[str]) -> Optional[str]:
     """Normaliza CEP para formato XXXXX-XXX."""
     if not zipcode:
         return None
-    digits = re.sub(r'\D', '', str(zipcode))
+    digits = _RE_NON_DIGIT.sub('', str(zipcode))
     if len(digits) == 8:
         return f"{digits[:5]}-{digits[5:]}"
     elif len(digits) == 7:
@@ -31,6 +72,7 @@ def normalize_zipcode(zipcode: Optional[str]) -> Optional[str]:
     return None
 
 
+@_cache_scalars
 def validate_price(price: Any) -> Optional[float]:
     """Valida e normaliza preço."""
     if price is None:
@@ -40,7 +82,7 @@ def validate_price(price: Any) -> Optional[float]:
             return float(price)
         return None
     if isinstance(price, str):
-        price_clean = re.sub(r'[^\d.,]', '', price)
+        price_clean = _RE_PRICE_STRIP.sub('', price)
         price_clean = price_clean.replace(',', '.')
         if price_clean.count('.') > 1:
             price_clean = price_clean.replace('.', '')
@@ -64,7 +106,7 @@ def validate_int_value(value: Any, min_val: int = 0, max_val: Optional[int] = No
                 return int_val
         return None
     if isinstance(value, str):
-        digits = re.sub(r'\D', '', value)
+        digits = _RE_NON_DIGIT.sub('', value)
         if digits:
             try:
                 int_val = int(digits)
@@ -76,6 +118,7 @@ def validate_int_value(value: Any, min_val: int = 0, max_val: Optional[int] = No
     return None
 
 
+@_cache_scalars
 def validate_url(url: Optional[str]) -> Optional[str]:
     """Valida URL."""
     if not url:
@@ -83,19 +126,13 @@ def validate_url(url: Optional[str]) -> Optional[str]:
     if not isinstance(url, str):
         url = str(url)
     url = url.strip()
-    url_pattern = re.compile(
-        r'^https?://'  # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
-        r'localhost|'  # localhost...
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # ...or ip
-        r'(?::\d+)?'  # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    if url_pattern.match(url):
-        return url
     if url.startswith('//'):
         return 'https:' + url
     elif url.startswith('/'):
         return 'https://www.vivareal.com.br' + url
+    # O regex completo só roda para o que já começa com http(s)://
+    if url[:8].lower().startswith(('http://', 'https://')) and _RE_URL.match(url):
+        return url
     return None
 
 
@@ -134,7 +171,8 @@ def clean_data(data: Dict[str, Any]) -> Dict[str, Any]:
             'city': None, 'neighborhood': None, 'street': None,
             'number': None, 'zipcode': None, 'complement': None, 'map_link': None,
         }
-    cleaned['description'] = normalize_text(data.get('description'))
+    # A descrição é grande e única por anúncio: não ocupa o cache compartilhado
+    cleaned['description'] = _normalize_text(data.get('description'))
     
     # Códigos
     cleaned['advertiser_code'] = normalize_text(data.get('advertiser_code'))
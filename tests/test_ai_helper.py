@@ -0,0 +1,115 @@
+"""Testes do cache das respostas da IA e dos fallbacks de IA por página."""
+import orjson
+import pytest
+
+from src import ai_helper
+from src.ai_helper import PageAIExtractor, extract_ai_combined
+
+_PHOTO = 'https://resizedimgs.vivareal.com/img/vr-listing/abc/1.jpg'
+_PAGE = f'<html><title>Casa</title><body><img src="{_PHOTO}"><address>Rua A, 10</address></body></html>'
+
+
+class FakeClient:
+    """Cliente OpenAI falso: registra as partes pedidas em cada chamada."""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        parts = sorted(kwargs['response_format']['json_schema']['schema']['properties'])
+        self.calls.append(parts)
+        content = {}
+        if 'images' in parts:
+            content['images'] = [_PHOTO]
+        if 'location' in parts:
+            content['location'] = {'city': 'São Luís', 'neighborhood': 'Centro', 'street': None,
+                                   'number': None, 'zipcode': None, 'map_link': None}
+        message = type('Message', (), {'content': orjson.dumps(content).decode()})
+        return type('Response', (), {'choices': [type('Choice', (), {'message': message})]})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(ai_helper, '_get_client', lambda: fake)
+    monkeypatch.setattr(ai_helper, '_extract_address_region', lambda html, soup=None: '<address>Rua A, 10</address>')
+    monkeypatch.setattr(ai_helper, '_ai_cache', ai_helper.OrderedDict())
+    return fake
+
+
+def test_cache_is_lru_bounded(monkeypatch):
+    monkeypatch.setattr(ai_helper, '_ai_cache', ai_helper.OrderedDict())
+    monkeypatch.setattr(ai_helper, '_AI_CACHE_MAX_ENTRIES', 2)
+    keys = [ai_helper._ai_cache_key(f'<p>{i}</p>', 'u', True, True) for i in range(3)]
+    ai_helper._ai_cache_put(keys[0], {'images': [], 'location': {}})
+    ai_helper._ai_cache_put(keys[1], {'images': [], 'location': {}})
+    assert ai_helper._ai_cache_get(keys[0]) is not None  # keys[0] passa a ser o mais recente
+    ai_helper._ai_cache_put(keys[2], {'images': [], 'location': {}})
+    assert ai_helper._ai_cache_get(keys[1]) is None
+    assert ai_helper._ai_cache_get(keys[0]) is not None
+    assert ai_helper._ai_cache_get(keys[2]) is not None
+
+
+def test_cache_returns_copies(monkeypatch):
+    monkeypatch.setattr(ai_helper, '_ai_cache', ai_helper.OrderedDict())
+    key = ai_helper._ai_cache_key('<p></p>', 'u', True, True)
+    ai_helper._ai_cache_put(key, {'images': [_PHOTO], 'location': {'city': 'X'}})
+    cached = ai_helper._ai_cache_get(key)
+    cached['images'].append('outra')
+    cached['location']['city'] = 'Y'
+    assert ai_helper._ai_cache_get(key) == {'images': [_PHOTO], 'location': {'city': 'X'}}
+
+
+def test_repeated_request_uses_cache(client):
+    first = extract_ai_combined(_PAGE, 'u', include_images=False)
+    second = extract_ai_combined(_PAGE, 'u', include_images=False)
+    assert first == second
+    assert client.calls == [['location']]
+
+
+def test_single_part_requests_reuse_combined_answer(client):
+    combined = extract_ai_combined(_PAGE, 'u')
+    location_only = extract_ai_combined(_PAGE, 'u', include_images=False)
+    images_only = extract_ai_combined(_PAGE, 'u', include_location=False)
+    assert client.calls == [['images', 'location']]
+    assert location_only == {'images': [], 'location': combined['location']}
+    assert images_only == {'images': combined['images'], 'location': {}}
+
+
+def test_failed_response_is_not_cached(client, monkeypatch):
+    def fail(**kwargs):
+        raise RuntimeError('timeout')
+    monkeypatch.setattr(client, 'create', fail)
+    assert extract_ai_combined(_PAGE, 'u', include_images=False) == {'images': [], 'location': {}}
+    assert len(ai_helper._ai_cache) == 0
+
+
+def test_location_alone_is_requested_on_resolve(client):
+    extractor = PageAIExtractor(_PAGE, 'u')
+    received = []
+    extractor.defer_location(received.append)
+    assert client.calls == []
+    extractor.resolve()
+    extractor.resolve()
+    assert client.calls == [['location']]
+    assert received[0]['city'] == 'São Luís'
+
+
+def test_both_fallbacks_share_one_call(client):
+    extractor = PageAIExtractor(_PAGE, 'u')
+    received = []
+    extractor.defer_location(received.append)
+    assert extractor.images() == [_PHOTO]
+    extractor.resolve()
+    extractor.images()
+    assert client.calls == [['images', 'location']]
+    assert [location['city'] for location in received] == ['São Luís']
+
+
+def test_images_alone_do_not_ask_for_location(client):
+    extractor = PageAIExtractor(_PAGE, 'u')
+    assert extractor.images() == [_PHOTO]
+    extractor.resolve()
+    assert client.calls == [['images']]
@@ -0,0 +1,159 @@
+"""Testes da varredura de texto e das características extraídas do HTML."""
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from src.extractors import (
+    _TEXT_WINDOW_CHARS,
+    _TEXT_WINDOW_OVERLAP,
+    ParsedPage,
+    _fill_features,
+    _iter_text_windows,
+    extract_images_from_scripts,
+)
+
+_LISTING_IMG = 'https://resizedimgs.vivareal.com/img/vr-listing/abc'
+_SCRIPTS_PAGE = (
+    '<html><head><title>Apartamento em São Luís</title>'
+    f'<script type="application/ld+json">{{"@type": "Product", "image": "{_LISTING_IMG}/1.jpg"}}</script></head>'
+    f'<body><script>window.photos = ["{_LISTING_IMG}/2.jpg"];</script></body></html>'
+)
+
+# Regex usado pelo antigo bloco que lia element.text de cada <li>; serve de referência para _RE_FEATURES
+_OLD_GARAGE_RE = re.compile(r'(?:(\d+)\s*(?:vaga|garagem)|garagem[:\s]*(\d+))', re.IGNORECASE)
+
+
+def _fake_soup(strings):
+    """_iter_text_windows só usa soup.strings."""
+    return SimpleNamespace(strings=strings)
+
+
+def _scan(strings):
+    """Repete o laço de extract_characteristics_into sobre as janelas."""
+    result = {}
+    for text, limit in _iter_text_windows(_fake_soup(strings)):
+        if _fill_features(text, result, limit):
+            break
+    return result
+
+
+def _filler(size):
+    """Texto sem dígitos, quebrado em strings de tamanhos variados."""
+    strings = []
+    while size > 0:
+        chunk = min(size, 97 + len(strings) % 13)
+        strings.append('x' * (chunk - 1) + ' ')
+        size -= chunk
+    return strings
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('2 vagas', 2),
+    ('garagem: 2', 2),
+    ('1 garagem', 1),
+    ('Garagem 3', 3),
+    ('1 vaga coberta', 1),
+    ('4 Vagas de garagem', 4),
+])
+def test_garage_forms(text, expected):
+    result = {}
+    _fill_features(text, result)
+    assert result['garage'] == expected
+
+
+@pytest.mark.parametrize('text', [
+    '2 vagas',
+    'garagem: 2',
+    '1 garagem',
+    'Apartamento com 3 quartos, 2 banheiros e 1 vaga',
+    '80 m² - garagem:2',
+    'sem garagem',
+])
+def test_garage_matches_old_element_regex(text):
+    match = _OLD_GARAGE_RE.search(text)
+    expected = int(match.group(1) or match.group(2)) if match else None
+    result = {}
+    _fill_features(text, result)
+    assert result.get('garage') == expected
+
+
+def test_fill_features_keeps_filled_fields_and_first_match():
+    result = {'bedrooms': 5}
+    assert _fill_features('70 m² 2 quartos 1 banheiro 1 vaga 3 quartos 90 m²', result)
+    assert result == {'bedrooms': 5, 'size_m2': 70, 'bathrooms': 1, 'garage': 1}
+
+
+def test_fill_features_reads_garage_from_title():
+    result = {}
+    _fill_features('Apartamento com 2 quartos, garagem: 1, em São Luís', result)
+    assert result == {'bedrooms': 2, 'garage': 1}
+
+
+def test_fill_features_ignores_matches_past_limit():
+    text = '2 quartos 3 vagas'
+    result = {}
+    assert not _fill_features(text, result, limit=text.index('3'))
+    assert result == {'bedrooms': 2}
+
+
+def test_single_window_for_short_text():
+    windows = list(_iter_text_windows(_fake_soup(['abc', ' def'])))
+    assert windows == [('abc def', len('abc def'))]
+
+
+def test_windows_cover_the_whole_text():
+    strings = _filler(3 * _TEXT_WINDOW_CHARS + 123)
+    full_text = ''.join(strings)
+    windows = list(_iter_text_windows(_fake_soup(strings)))
+    assert len(windows) > 1
+    # Cada janela começa com o final da anterior e a última termina no fim do texto
+    for (previous, _), (current, _) in zip(windows, windows[1:]):
+        assert current.startswith(previous[-2 * _TEXT_WINDOW_OVERLAP:])
+    assert full_text.endswith(windows[-1][0])
+    assert windows[-1][1] == len(windows[-1][0])
+
+
+@pytest.mark.parametrize('value, split, expected', [
+    ('garagem: 12', 10, {'garage': 12}),
+    ('12 vagas', 1, {'garage': 12}),
+    ('120 m²', 2, {'size_m2': 120}),
+])
+def test_match_split_across_window_boundary(value, split, expected):
+    # A primeira janela fecha no meio do valor: o trecho parcial ("garagem: 1") não pode ser aceito
+    # e o valor inteiro precisa reaparecer na janela seguinte
+    strings = _filler(_TEXT_WINDOW_CHARS - 1) + [value[:split], value[split:] + ' '] + _filler(500)
+    first_window, _ = next(_iter_text_windows(_fake_soup(strings)))
+    assert first_window.endswith(value[:split])
+    assert _scan(strings) == expected
+
+
+def test_match_in_overlap_is_not_taken_early():
+    # O primeiro match cai depois do limite da primeira janela; o valor vem da janela seguinte
+    strings = _filler(_TEXT_WINDOW_CHARS - _TEXT_WINDOW_OVERLAP // 2) + ['12 vagas '] + _filler(_TEXT_WINDOW_CHARS)
+    assert _scan(strings) == {'garage': 12}
+
+
+@pytest.mark.parametrize('prefix', ['', '<?xml version="1.0" encoding="utf-8"?>\n', '<!DOCTYPE html>\n'])
+def test_scripts_strategy_reads_json_ld_and_inline_scripts(prefix):
+    page_source = prefix + _SCRIPTS_PAGE
+    assert ParsedPage(page_source).json_ld_texts == [f'{{"@type": "Product", "image": "{_LISTING_IMG}/1.jpg"}}']
+    assert extract_images_from_scripts(page_source) == [f'{_LISTING_IMG}/1.jpg', f'{_LISTING_IMG}/2.jpg']
+
+
+@pytest.mark.parametrize('page_source', ['', '   ', '\n\t\n'])
+def test_scripts_strategy_handles_empty_pages(page_source):
+    assert ParsedPage(page_source).json_ld_texts == []
+    assert extract_images_from_scripts(page_source) == []
+
+
+def test_scripts_strategy_splits_urls_in_attribute_json():
+    page_source = (
+        '<html><head><title>Apartamento</title></head><body>'
+        f'<div data-props="{{&quot;images&quot;:[&quot;{_LISTING_IMG}/1.jpg&quot;,'
+        f'&quot;{_LISTING_IMG}/2.jpg?w=800&amp;h=600&quot;]}}"></div>'
+        f'<script>window.photos = ["{_LISTING_IMG}/3.webp"];</script></body></html>'
+    )
+    assert extract_images_from_scripts(page_source) == [
+        f'{_LISTING_IMG}/1.jpg', f'{_LISTING_IMG}/2.jpg', f'{_LISTING_IMG}/3.webp',
+    ]
@@ -0,0 +1,64 @@
+"""Testes do controle de intervalo entre requisições."""
+import pytest
+
+from src import utils
+from src.utils import HostThrottle, rate_limit
+
+
+class FakeClock:
+    """Relógio controlado pelo teste: sleep apenas avança o tempo."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(utils.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(utils.time, 'sleep', fake.sleep)
+    return fake
+
+
+def test_host_throttle_spaces_requests_to_the_same_host(clock):
+    throttle = HostThrottle(min_interval=3.0)
+    throttle.wait('https://www.vivareal.com.br/imovel/a-id-1/')
+    throttle.wait('https://www.vivareal.com.br/imovel/b-id-2/')
+    throttle.wait('https://WWW.VIVAREAL.COM.BR/imovel/c-id-3/')
+    assert clock.sleeps == [3.0, 3.0]
+
+
+def test_host_throttle_does_not_wait_across_hosts(clock):
+    throttle = HostThrottle(min_interval=3.0)
+    throttle.wait('https://www.vivareal.com.br/imovel/a-id-1/')
+    throttle.wait('https://resizedimgs.vivareal.com/img/1.jpg')
+    assert clock.sleeps == []
+
+
+def test_host_throttle_discounts_elapsed_time(clock):
+    throttle = HostThrottle(min_interval=3.0)
+    throttle.wait('https://www.vivareal.com.br/')
+    clock.now += 2.0
+    throttle.wait('https://www.vivareal.com.br/')
+    clock.now += 5.0
+    throttle.wait('https://www.vivareal.com.br/')
+    assert clock.sleeps == [pytest.approx(1.0)]
+
+
+def test_rate_limit_per_host_sleeps_only_the_remainder(clock, monkeypatch):
+    monkeypatch.setattr(utils.random, 'uniform', lambda low, high: 2.0)
+    monkeypatch.setattr(utils, '_last_request', {})
+    rate_limit(1, 2, host='www.vivareal.com.br')
+    clock.now += 0.5
+    rate_limit(1, 2, host='www.vivareal.com.br')
+    rate_limit(1, 2, host='outro.host')
+    rate_limit(1, 2)
+    assert clock.sleeps == [2.0, pytest.approx(1.5), 2.0, 2.0]
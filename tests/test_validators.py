@@ -0,0 +1,72 @@
+"""Testes da validação e limpeza dos dados extraídos."""
+import pytest
+
+from src.validators import clean_data, normalize_text, normalize_zipcode, validate_price, validate_url
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://www.vivareal.com.br/imovel/apartamento-id-123/', 'https://www.vivareal.com.br/imovel/apartamento-id-123/'),
+    ('http://localhost:8080/foto.jpg?w=800', 'http://localhost:8080/foto.jpg?w=800'),
+    ('HTTPS://Example.COM', 'HTTPS://Example.COM'),
+    ('  https://example.com/a  ', 'https://example.com/a'),
+    ('//resizedimgs.vivareal.com/img/1.jpg', 'https://resizedimgs.vivareal.com/img/1.jpg'),
+    ('/imovel/casa-id-1/', 'https://www.vivareal.com.br/imovel/casa-id-1/'),
+    ('https://example.com#secao', 'https://example.com#secao'),
+])
+def test_validate_url_accepts(url, expected):
+    assert validate_url(url) == expected
+
+
+@pytest.mark.parametrize('url', [
+    None,
+    '',
+    'ftp://example.com/arquivo',
+    'www.vivareal.com.br/imovel/',
+    'http://',
+    'https://exa mple.com',
+    'https://example.com/a b',
+    'https://exemplo.com.br:porta/',
+    'javascript:alert(1)',
+])
+def test_validate_url_rejects(url):
+    assert validate_url(url) is None
+
+
+def test_normalize_text_collapses_whitespace():
+    assert normalize_text('  Rua  das\n Flores ') == 'Rua das Flores'
+    assert normalize_text(' \n\t ') is None
+    assert normalize_text(None) is None
+
+
+def test_description_bypasses_the_text_cache():
+    normalize_text.cache_clear()
+    description = 'Apartamento   amplo,\n perto do metrô. ' * 50
+    cleaned = clean_data({'description': description, 'property_type': ' Apartamento '})
+    assert cleaned['description'] == ' '.join(description.split())
+    assert cleaned['property_type'] == 'Apartamento'
+    # A descrição não entrou no cache: normalizá-la agora é um miss
+    misses = normalize_text.cache_info().misses
+    normalize_text(description)
+    assert normalize_text.cache_info().misses == misses + 1
+
+
+def test_cached_validators_accept_unhashable_values():
+    assert validate_price([1]) is None
+    assert validate_price({'valor': 1}) is None
+    assert normalize_text(['a']) == "['a']"
+    assert normalize_zipcode(['65000', '000']) == '65000-000'
+    assert validate_url({'url': 'https://example.com'}) is None
+    cleaned = clean_data({
+        'price': [450000], 'property_type': ['Casa'], 'description': {'texto': 'x'},
+        'location': {'city': ['São Luís'], 'zipcode': {'cep': '65000000'}},
+        'images': [['https://example.com/1.jpg'], 'https://example.com/2.jpg'],
+    })
+    assert cleaned['price'] is None
+    assert cleaned['location']['zipcode'] == '65000-000'
+    assert cleaned['images'] == ['https://example.com/2.jpg']
+
+
+def test_cached_validators_still_cache_scalars():
+    validate_price.cache_clear()
+    assert validate_price('R$ 1.234,56') == validate_price('R$ 1.234,56')
+    assert validate_price.cache_info().hits == 1